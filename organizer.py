@@ -1,9 +1,29 @@
 import os
 import shutil
+import signal
 import json
 import logging
 import csv
-from datetime import datetime
+import ctypes
+import errno
+import heapq
+import hmac
+import ipaddress
+import itertools
+import mmap
+import re
+import secrets
+import struct
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from stat import S_ISREG
+from types import MappingProxyType
 import requests
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
@@ -12,6 +32,8 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pystray
 from PIL import Image
 import winshell
@@ -19,6 +41,24 @@ import pythoncom
 import win32com.client
 import sys
 
+try:
+    # POSIX only: used for reflink (FICLONE) copies
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    # Optional: only needed for tar.zst archive bundles
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    # Optional: vectorizes file catalog queries
+    import numpy
+except ImportError:
+    numpy = None
+
 # Configure logging
 logging.basicConfig(
     filename='organizer.log',
@@ -29,6 +69,9 @@ logging.basicConfig(
 # Application version
 APP_VERSION = "1.0.0"
 
+# Worker threads per monitored folder that wait for files to finish and organize them
+HANDLER_WORKERS = 4
+
 def get_resource_path(relative_path):
     """Get the absolute path to a resource, handling PyInstaller bundled environment."""
     try:
@@ -39,9 +82,9 @@ def get_resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def load_config(config_file='categories.json'):
-    """Load file extension categories, monitored folders, and settings from a JSON config file."""
-    default_config = {
+def get_default_config():
+    """Return a fresh copy of the built-in configuration that a missing or partial config file falls back to."""
+    return {
         "categories": {
             '.pdf': 'Documents',
             '.doc': 'Documents',
@@ -67,11 +110,56 @@ def load_config(config_file='categories.json'):
         "startup_enabled": False,
         "appearance_mode": "system",
         "organize_by_date": False,
+        "date_sources": {
+            "Images": ["exif", "mtime"],
+            "Videos": ["mp4", "mtime"],
+            "Documents": ["pdf", "mtime"],
+            "default": ["mtime"]
+        },
+        "routes": {},
+        "scheduling": {
+            "weights": {"interactive": 8, "normal": 3, "bulk": 1},
+            "small_file_size": 16 * 1024 * 1024,
+            "large_file_size": 1024 * 1024 * 1024,
+            "bulk_categories": ["Videos", "Archives"]
+        },
+        "throttling": {
+            "enabled": True,
+            "interval": 5,
+            "busy_cpu": 0.75,
+            "busy_disk_queue": 8,
+            "memory_limit": 0.9,
+            "idle_seconds": 120,
+            "throttled_io_rate": 16 * 1024 * 1024,
+            "throttle_on_battery": True
+        },
+        "control_api": {
+            "enabled": False,
+            "host": "127.0.0.1",
+            "port": 47800,
+            "token": "",
+            "allowed_hosts": [],
+            "max_queued_events": 10000
+        },
+        "archiving": {
+            "enabled": False,
+            "categories": ["Code", "Documents"],
+            "format": "zip",
+            "max_file_size": 256 * 1024,
+            "min_age_days": 30,
+            "min_files": 200,
+            "max_bundle_files": 10000,
+            "interval": 3600
+        },
         "folder_settings": {
             "C:/Users/Dell/Downloads/file-organizer/test": {"recursive": True, "exclusions": []},
             "C:/Users/Dell/OneDrive/Desktop/test": {"recursive": True, "exclusions": []}
         }
     }
+
+def load_config(config_file='categories.json'):
+    """Load file extension categories, monitored folders, and settings from a JSON config file."""
+    default_config = get_default_config()
     
     config_path = get_resource_path(config_file)
     try:
@@ -83,7 +171,8 @@ def load_config(config_file='categories.json'):
             for folder in folder_settings:
                 folder_settings[folder] = {
                     "recursive": folder_settings[folder].get("recursive", False),
-                    "exclusions": [os.path.normpath(e) for e in folder_settings[folder].get("exclusions", []) if os.path.isabs(e)]
+                    "exclusions": [os.path.normpath(e) if os.path.isabs(e) else e for e in folder_settings[folder].get("exclusions", []) if os.path.isabs(e) or is_glob_pattern(e)],
+                    "priority": folder_settings[folder].get("priority", "normal")
                 }
             loaded_config['folder_settings'] = folder_settings
             default_config.update(loaded_config)
@@ -96,160 +185,3299 @@ def load_config(config_file='categories.json'):
         logging.error("Error loading config file %s: %s", config_path, e)
         return default_config
 
-def save_config(config, config_file='categories.json'):
-    """Save the configuration to a JSON file."""
-    config_path = get_resource_path(config_file)
-    try:
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=4)
-        logging.info("Saved config to %s", config_path)
-    except Exception as e:
-        logging.error("Error saving config file %s: %s", config_path, e)
+def save_config(config, config_file='categories.json'):
+    """Save the configuration to a JSON file."""
+    config_path = get_resource_path(config_file)
+    try:
+        with open(config_file, 'w') as f:
+            json.dump(config, f, indent=4)
+        logging.info("Saved config to %s", config_path)
+    except Exception as e:
+        logging.error("Error saving config file %s: %s", config_path, e)
+
+# Extensions of temporary and OneDrive placeholder files that are never organized
+TEMP_SUFFIXES = frozenset(('.tmp', '.download', '.crdownload', '.onetoc2', '.onecache'))
+
+def _freeze(value):
+    """Return a read-only copy of nested config values: dicts become mappingproxies and lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value):
+    """Return a mutable, JSON-serializable copy of a frozen config value."""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def normalize_folder_key(folder):
+    """Return the key used to look up per-folder settings regardless of separators and case."""
+    return os.path.normcase(os.path.normpath(folder))
+
+class ConfigSnapshot:
+    """Immutable, versioned view of the configuration with the lookups used on every event precomputed.
+
+    Handlers read it without locks; a configuration change builds a new snapshot and swaps the reference.
+    """
+    __slots__ = ('version', 'raw', 'categories', 'category_names', 'temp_suffixes', 'monitored_folders',
+                 'folder_settings', 'organize_by_date', 'date_sources', 'archiving', 'routes', 'scheduling')
+    _versions = itertools.count(1)
+    DEFAULT_FOLDER_SETTINGS = MappingProxyType({"recursive": True, "exclusions": (), "priority": "normal"})
+
+    def __init__(self, config):
+        frozen = _freeze(config)
+        categories = MappingProxyType({ext.lower(): category for ext, category in frozen.get('categories', {}).items()})
+        folder_settings = {}
+        for folder, settings in frozen.get('folder_settings', {}).items():
+            folder_settings[normalize_folder_key(folder)] = MappingProxyType({
+                "recursive": bool(settings.get("recursive", False)),
+                "exclusions": tuple(settings.get("exclusions", ())),
+                "priority": settings.get("priority", "normal")
+            })
+        values = {
+            'version': next(self._versions),
+            'raw': frozen,
+            'categories': categories,
+            'category_names': frozenset(categories.values()) | {'Others'},
+            'temp_suffixes': frozenset(suffix.lower() for suffix in frozen.get('temp_suffixes', TEMP_SUFFIXES)),
+            'monitored_folders': tuple(frozen.get('monitored_folders', ())),
+            'folder_settings': MappingProxyType(folder_settings),
+            'organize_by_date': bool(frozen.get('organize_by_date', False)),
+            'date_sources': frozen.get('date_sources', MappingProxyType({})),
+            'archiving': frozen.get('archiving', MappingProxyType({})),
+            'routes': frozen.get('routes', MappingProxyType({})),
+            'scheduling': frozen.get('scheduling', MappingProxyType({})),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable; build a new snapshot instead")
+
+    def __delattr__(self, name):
+        raise AttributeError("ConfigSnapshot is immutable; build a new snapshot instead")
+
+    def settings_for(self, folder):
+        """Return the recursive/exclusions/priority settings for a monitored folder."""
+        return self.folder_settings.get(normalize_folder_key(folder), self.DEFAULT_FOLDER_SETTINGS)
+
+    def to_dict(self):
+        """Return a mutable copy of the configuration for editing and saving."""
+        return _thaw(self.raw)
+
+_snapshot_cache = {}
+_snapshot_cache_lock = threading.Lock()
+
+def get_config_snapshot(config_file='categories.json'):
+    """Return a ConfigSnapshot of the config file, reusing the previous one while the file is unchanged."""
+    config_path = get_resource_path(config_file)
+
+    def file_key():
+        try:
+            stat = os.stat(config_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    key = file_key()
+    with _snapshot_cache_lock:
+        cached = _snapshot_cache.get(config_path)
+        if cached and key is not None and cached[0] == key:
+            return cached[1]
+    snapshot = ConfigSnapshot(load_config(config_file))
+    # A missing config file is written with the defaults by load_config
+    key = key or file_key()
+    with _snapshot_cache_lock:
+        _snapshot_cache[config_path] = (key, snapshot)
+    return snapshot
+
+def get_category(file_name, categories, temp_suffixes=TEMP_SUFFIXES):
+    """Return the category folder for a given file based on its extension."""
+    _, ext = os.path.splitext(file_name)
+    ext = ext.lower()
+    
+    if ext in temp_suffixes:
+        logging.info("Skipped temporary/OneDrive file: %s", file_name)
+        return None
+    
+    return categories.get(ext, 'Others')
+
+def is_already_organized(file_path, base_folder, categories, temp_suffixes=TEMP_SUFFIXES):
+    """Check if a file is already in its correct category folder."""
+    file_name = os.path.basename(file_path)
+    expected_category = get_category(file_name, categories, temp_suffixes)
+    if not expected_category:
+        return True
+    
+    current_folder = os.path.normpath(os.path.normcase(os.path.dirname(file_path)))
+    expected_folder = os.path.normpath(os.path.normcase(os.path.join(base_folder, expected_category)))
+    base_folder_normalized = os.path.normpath(os.path.normcase(base_folder))
+    
+    is_correct = current_folder.startswith(expected_folder) and current_folder != base_folder_normalized
+    if is_correct:
+        logging.info("Skipped %s: already in correct folder %s", file_name, expected_category)
+    else:
+        logging.info("Processing %s: current=%s, expected=%s, root=%s", file_name, current_folder, expected_folder, base_folder_normalized)
+    return is_correct
+
+# Maximum number of header bytes read when looking for embedded dates
+DATE_HEADER_LIMIT = 64 * 1024
+# Seconds between the MP4/QuickTime epoch (1904-01-01) and the Unix epoch
+MP4_EPOCH_OFFSET = 2082844800
+# Extracted dates keyed by (inode, size, mtime) so rescans skip the file reads
+DATE_CACHE_SIZE = 65536
+_date_cache = OrderedDict()
+_date_cache_lock = threading.Lock()
+
+def _parse_exif_datetime(value):
+    """Parse an EXIF 'YYYY:MM:DD HH:MM:SS' string, returning None if it is blank or invalid."""
+    try:
+        return datetime.strptime(value.split(b'\x00')[0].decode('ascii').strip(), '%Y:%m:%d %H:%M:%S')
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _parse_tiff_date(data):
+    """Return DateTimeOriginal (or DateTime) from a TIFF structure such as an EXIF APP1 payload."""
+    if data[:2] == b'II':
+        endian = '<'
+    elif data[:2] == b'MM':
+        endian = '>'
+    else:
+        return None
+
+    def read_ifd(offset):
+        entries = {}
+        if offset + 2 > len(data):
+            return entries
+        count = struct.unpack_from(endian + 'H', data, offset)[0]
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            if entry + 12 > len(data):
+                break
+            tag, type_, num = struct.unpack_from(endian + 'HHI', data, entry)
+            if type_ == 2:  # ASCII
+                value_offset = entry + 8 if num <= 4 else struct.unpack_from(endian + 'I', data, entry + 8)[0]
+                entries[tag] = data[value_offset:value_offset + num]
+            elif type_ == 4:  # LONG
+                entries[tag] = struct.unpack_from(endian + 'I', data, entry + 8)[0]
+        return entries
+
+    ifd0 = read_ifd(struct.unpack_from(endian + 'I', data, 4)[0])
+    exif_ifd = read_ifd(ifd0[0x8769]) if isinstance(ifd0.get(0x8769), int) else {}
+    for tags, tag in ((exif_ifd, 0x9003), (exif_ifd, 0x9004), (ifd0, 0x0132)):
+        if isinstance(tags.get(tag), bytes):
+            parsed = _parse_exif_datetime(tags[tag])
+            if parsed:
+                return parsed
+    return None
+
+def read_exif_date(file_path):
+    """Read the EXIF capture date from a JPEG or TIFF-based file, reading only its header segments."""
+    with open(file_path, 'rb') as f:
+        head = f.read(4)
+        if head[:4] in (b'II*\x00', b'MM\x00*'):
+            f.seek(0)
+            return _parse_tiff_date(f.read(DATE_HEADER_LIMIT))
+        if head[:2] != b'\xff\xd8':
+            return None
+        f.seek(2)
+        while f.tell() < DATE_HEADER_LIMIT:
+            marker = f.read(4)
+            if len(marker) < 4 or marker[0] != 0xFF:
+                return None
+            length = struct.unpack('>H', marker[2:])[0]
+            if marker[1] == 0xE1:
+                segment = f.read(length - 2)
+                if segment[:6] == b'Exif\x00\x00':
+                    return _parse_tiff_date(segment[6:])
+            elif marker[1] in (0xDA, 0xD9):  # Start of scan / end of image: no more metadata
+                return None
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+def read_mp4_date(file_path):
+    """Read the creation time from the 'mvhd' atom of an MP4/MOV file, seeking past media data."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        end = file_size
+        while f.tell() + 8 <= end:
+            start = f.tell()
+            size, atom = struct.unpack('>I4s', f.read(8))
+            header = 8
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                header = 16
+            elif size == 0:
+                size = end - start
+            if size < header:
+                return None
+            if atom == b'moov':
+                end = start + size  # Descend into the movie atom
+                continue
+            if atom == b'mvhd':
+                version = f.read(4)[0]
+                if version == 1:
+                    created = struct.unpack('>Q', f.read(8))[0]
+                else:
+                    created = struct.unpack('>I', f.read(4))[0]
+                if created <= MP4_EPOCH_OFFSET:
+                    return None
+                # mvhd times are UTC; keep the result naive like the other readers
+                return datetime.fromtimestamp(created - MP4_EPOCH_OFFSET, timezone.utc).replace(tzinfo=None)
+            f.seek(start + size)
+    return None
+
+def read_pdf_date(file_path):
+    """Read /CreationDate from the head or tail of a PDF, where the document info usually lives."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        chunks = [f.read(DATE_HEADER_LIMIT)]
+        if chunks[0][:5] != b'%PDF-':
+            return None
+        if file_size > DATE_HEADER_LIMIT:
+            f.seek(max(DATE_HEADER_LIMIT, file_size - DATE_HEADER_LIMIT))
+            chunks.append(f.read())
+    for chunk in chunks:
+        match = re.search(rb'/CreationDate\s*\(\s*D:(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?', chunk)
+        if match:
+            parts = [int(p) if p else d for p, d in zip(match.groups(), (0, 1, 1, 0, 0, 0))]
+            try:
+                return datetime(*parts)
+            except ValueError:
+                return None
+    return None
+
+DATE_READERS = {
+    "exif": read_exif_date,
+    "mp4": read_mp4_date,
+    "pdf": read_pdf_date,
+}
+
+def get_file_date(file_path, category, date_sources=None):
+    """Return the best date for a file, trying the category's metadata sources before falling back to mtime."""
+    stat = os.stat(file_path)
+    date_sources = date_sources or {}
+    sources = date_sources.get(category, date_sources.get("default", ["mtime"]))
+    cache_key = (stat.st_dev, stat.st_ino or file_path, stat.st_size, stat.st_mtime_ns, tuple(sources))
+    with _date_cache_lock:
+        if cache_key in _date_cache:
+            _date_cache.move_to_end(cache_key)
+            return _date_cache[cache_key]
+
+    file_date = None
+    for source in sources:
+        reader = DATE_READERS.get(source)
+        if not reader:
+            continue
+        try:
+            file_date = reader(file_path)
+        except (OSError, struct.error, IndexError, OverflowError, ValueError) as e:
+            logging.debug("Could not read %s date from %s: %s", source, file_path, e)
+        if file_date:
+            logging.debug("Using %s date %s for %s", source, file_date, file_path)
+            break
+    if not file_date:
+        file_date = datetime.fromtimestamp(stat.st_mtime)
+
+    with _date_cache_lock:
+        _date_cache[cache_key] = file_date
+        if len(_date_cache) > DATE_CACHE_SIZE:
+            _date_cache.popitem(last=False)
+    return file_date
+
+class _NullSpan:
+    """Span used while profiling is off; entering and leaving it costs next to nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """Time one stage and add it to the profiler's per-stage totals."""
+    __slots__ = ('profiler', 'stage', 'start')
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.stage, time.perf_counter_ns() - self.start)
+        return False
+
+class Profiler:
+    """Opt-in timing spans for organize_file stages and handler callbacks, plus sampled stacks for flame graphs.
+
+    Spans are only recorded while a capture is running; start and stop can be called at any time
+    from the GUI, the tray or SIGUSR1 without restarting the watchers.
+    """
+    def __init__(self, output_folder='profiles', sample_interval=0.005):
+        self.output_folder = output_folder
+        self.sample_interval = sample_interval
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages = {}  # stage -> [count, total_ns, max_ns]
+        self.stacks = {}  # collapsed stack -> samples
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._timer = None
+
+    def span(self, stage):
+        """Return a context manager timing a stage, or a shared no-op one while profiling is off."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage, elapsed_ns):
+        """Add one timed run of a stage."""
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [1, elapsed_ns, elapsed_ns]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed_ns
+                if elapsed_ns > entry[2]:
+                    entry[2] = elapsed_ns
+
+    def start(self, duration=None, on_done=None):
+        """Start a capture, stopping and exporting it after duration seconds if given."""
+        with self.lock:
+            if self.enabled:
+                return False
+            self.stages = {}
+            self.stacks = {}
+            self.started_at = time.time()
+            self._stop_event.clear()
+            self.enabled = True
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        if duration:
+            def finish():
+                paths = self.stop()
+                if on_done and paths:
+                    on_done(paths)
+            self._timer = threading.Timer(duration, finish)
+            self._timer.daemon = True
+            self._timer.start()
+        logging.info("Profiling started%s", f" for {duration} seconds" if duration else "")
+        return True
+
+    def stop(self):
+        """Stop the capture and export it; returns (collapsed stacks path, summary path) or None."""
+        with self.lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+            self.stopped_at = time.time()
+        self._stop_event.set()
+        if self._timer and self._timer is not threading.current_thread():
+            self._timer.cancel()
+        self._timer = None
+        if self._sampler:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        logging.info("Profiling stopped after %.1f seconds", self.stopped_at - self.started_at)
+        return self.export()
+
+    def toggle(self, on_done=None):
+        """Start a capture if none is running, otherwise stop and export the current one."""
+        if self.enabled:
+            paths = self.stop()
+            if on_done and paths:
+                on_done(paths)
+        else:
+            self.start()
+
+    def _sample(self):
+        """Record the stack of every other thread at a fixed interval."""
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                samples.append(';'.join(reversed(frames)))
+            with self.lock:
+                for stack in samples:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def format_summary(self):
+        """Return the per-stage timing table, slowest total first."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True)
+            samples = sum(self.stacks.values())
+        elapsed = (self.stopped_at if not self.enabled else time.time()) - self.started_at
+        lines = [f"Profile of {elapsed:.1f} seconds, {samples} stack samples",
+                 f"{'Stage':<24}{'Calls':>10}{'Total ms':>12}{'Mean ms':>10}{'Max ms':>10}"]
+        for stage, (count, total_ns, max_ns) in stages:
+            lines.append(f"{stage:<24}{count:>10}{total_ns / 1e6:>12.1f}{total_ns / count / 1e6:>10.3f}{max_ns / 1e6:>10.1f}")
+        if not stages:
+            lines.append("No stages recorded.")
+        return "\n".join(lines)
+
+    def export(self):
+        """Write collapsed stacks (for flamegraph.pl or speedscope) and the stage summary to the output folder."""
+        try:
+            os.makedirs(self.output_folder, exist_ok=True)
+            name = datetime.fromtimestamp(self.started_at).strftime('profile_%Y%m%d_%H%M%S')
+            stacks_path = os.path.join(self.output_folder, name + '.folded')
+            summary_path = os.path.join(self.output_folder, name + '.txt')
+            with self.lock:
+                stacks = sorted(self.stacks.items())
+            with open(stacks_path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks:
+                    f.write(f"{stack} {count}\n")
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                f.write(self.format_summary() + "\n")
+            logging.info("Exported profile to %s and %s", stacks_path, summary_path)
+            return stacks_path, summary_path
+        except Exception as e:
+            logging.error("Error exporting profile: %s", e)
+            return None
+
+PROFILER = Profiler()
+
+# Target paths claimed by moves in progress, so concurrent workers never pick the same free name
+_reserved_targets = set()
+_reserved_targets_lock = threading.Lock()
+
+def reserve_target_path(target_folder, file_name):
+    """Pick a free target path, adding _N before the extension on collisions, and reserve it until released."""
+    base_name, ext = os.path.splitext(file_name)
+    target_path = os.path.join(target_folder, file_name)
+    counter = 1
+    with _reserved_targets_lock:
+        while os.path.normcase(target_path) in _reserved_targets or os.path.exists(target_path):
+            target_path = os.path.join(target_folder, f"{base_name}_{counter}{ext}")
+            counter += 1
+        _reserved_targets.add(os.path.normcase(target_path))
+    return target_path
+
+def release_target_path(target_path):
+    """Release a target path reserved by reserve_target_path."""
+    with _reserved_targets_lock:
+        _reserved_targets.discard(os.path.normcase(target_path))
+
+class DirectoryCache:
+    """Folders already known to exist and be writable, so organizing a file skips makedirs and access checks.
+
+    Entries are dropped when the observer reports a folder deleted or moved, and whenever a move
+    into a cached folder fails because the folder has gone.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writable = set()
+
+    def is_writable(self, folder):
+        """Return whether a folder is writable, checking each folder only once."""
+        key = os.path.normcase(os.path.normpath(folder))
+        if key in self.writable:
+            return True
+        if not os.access(folder, os.W_OK):
+            return False
+        with self.lock:
+            self.writable.add(key)
+        return True
+
+    def ensure(self, folder):
+        """Create a folder unless it is already known to exist."""
+        key = os.path.normcase(os.path.normpath(folder))
+        if key in self.writable:
+            return
+        os.makedirs(folder, exist_ok=True)
+        with self.lock:
+            self.writable.add(key)
+
+    def precreate(self, folders):
+        """Create the missing folders of a backlog in one pass before its files are organized."""
+        created = 0
+        for folder in sorted(set(folders)):
+            key = os.path.normcase(os.path.normpath(folder))
+            if key in self.writable:
+                continue
+            try:
+                if not os.path.isdir(folder):
+                    os.makedirs(folder, exist_ok=True)
+                    created += 1
+                with self.lock:
+                    self.writable.add(key)
+            except OSError as e:
+                logging.error("Error creating folder %s: %s", folder, e)
+        return created
+
+    def invalidate(self, folder):
+        """Forget a folder and every folder below it."""
+        key = os.path.normcase(os.path.normpath(folder))
+        prefix = key.rstrip(os.sep) + os.sep
+        with self.lock:
+            self.writable = {known for known in self.writable if known != key and not known.startswith(prefix)}
+
+# Extra actions a category can route an organized file to, besides the primary move
+ROUTE_ACTIONS = ('copy', 'hardlink', 'reflink', 'symlink')
+# Linux ioctl that makes dst share src's data blocks (Btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+FAN_OUT_CHUNK_SIZE = 1024 * 1024
+
+def reflink_file(source_path, target_path):
+    """Create target_path as a copy-on-write clone of source_path, raising OSError where unsupported."""
+    if sys.platform.startswith('linux') and fcntl is not None:
+        with open(source_path, 'rb') as src, open(target_path, 'xb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                dst.close()
+                os.remove(target_path)
+                raise
+    elif sys.platform == 'darwin':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source_path), os.fsencode(target_path), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), target_path)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform", target_path)
+    shutil.copystat(source_path, target_path)
+
+def copy_to_many(source_path, target_paths):
+    """Copy a file to several targets reading it only once; returns the targets that were written."""
+    writers = []
+    for target_path in target_paths:
+        try:
+            writers.append((target_path, open(target_path, 'xb')))
+        except OSError as e:
+            logging.error("Error creating copy %s: %s", target_path, e)
+    try:
+        with open(source_path, 'rb') as src:
+            while writers:
+                chunk = src.read(FAN_OUT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for target_path, writer in list(writers):
+                    try:
+                        writer.write(chunk)
+                        IO_THROTTLE.consume(len(chunk))
+                    except OSError as e:
+                        # One failing destination must not stop the others
+                        logging.error("Error writing copy %s: %s", target_path, e)
+                        _discard_copy(target_path, writer)
+                        writers.remove((target_path, writer))
+        for target_path, writer in writers:
+            writer.close()
+            shutil.copystat(source_path, target_path)
+    except Exception:
+        # A failed read, close or copystat leaves every copy suspect, so none of them is kept
+        for target_path, writer in writers:
+            _discard_copy(target_path, writer)
+        raise
+    return [target_path for target_path, _ in writers]
+
+def _discard_copy(target_path, writer):
+    """Close and delete a partially written copy, ignoring errors from either step."""
+    try:
+        writer.close()
+    except OSError:
+        pass
+    try:
+        os.remove(target_path)
+    except OSError as e:
+        logging.error("Error removing partial copy %s: %s", target_path, e)
+
+def fan_out_file(source_path, routes):
+    """Mirror an organized file to each route's destination and return (target, action) pairs.
+
+    Hardlinks and reflinks cost no data copies on the same volume; everything that needs real copying
+    is written from a single read of the source. Errors are logged and never raised, because the
+    move that preceded the fan-out has already succeeded.
+    """
+    file_name = os.path.basename(source_path)
+    try:
+        source_device = os.stat(source_path).st_dev
+    except OSError as e:
+        logging.error("Error routing %s: %s", file_name, e)
+        return []
+    done = []
+    copies = []
+    for route in routes:
+        action = destination = target_path = None
+        try:
+            action = route.get("action", "copy")
+            destination = route.get("destination")
+            if action not in ROUTE_ACTIONS or not destination:
+                logging.warning("Ignoring invalid route %s for %s", route, file_name)
+                continue
+            os.makedirs(destination, exist_ok=True)
+            target_path = reserve_target_path(destination, file_name)
+            same_volume = os.stat(destination).st_dev == source_device
+            if action == 'symlink':
+                os.symlink(source_path, target_path)
+            elif action == 'hardlink' and same_volume:
+                os.link(source_path, target_path)
+            elif action in ('reflink', 'copy') and same_volume:
+                try:
+                    reflink_file(source_path, target_path)
+                    action = 'reflink'
+                except OSError as e:
+                    logging.debug("Reflink of %s to %s not possible, copying instead: %s", file_name, destination, e)
+                    copies.append(target_path)
+                    continue
+            else:
+                copies.append(target_path)
+                continue
+            done.append((target_path, action))
+        except Exception as e:
+            logging.error("Error routing %s to %s (%s): %s", file_name, destination, action, e)
+        if target_path:
+            release_target_path(target_path)
+    if copies:
+        try:
+            done.extend((target_path, 'copy') for target_path in copy_to_many(source_path, copies))
+        except Exception as e:
+            logging.error("Error copying %s to route destinations: %s", file_name, e)
+        finally:
+            for target_path in copies:
+                release_target_path(target_path)
+    for target_path, action in done:
+        logging.info("Routed %s to %s (%s)", file_name, target_path, action)
+    return done
+
+def move_into_known_folder(file_path, target_path, dirs):
+    """Rename a file into a cached folder, recreating the folder if it vanished and copying across volumes."""
+    try:
+        os.rename(file_path, target_path)
+    except FileNotFoundError:
+        if not os.path.exists(file_path):
+            raise
+        # The folder was removed without an event reaching us (e.g. a date folder under a non-recursive watch)
+        target_folder = os.path.dirname(target_path)
+        dirs.invalidate(target_folder)
+        dirs.ensure(target_folder)
+        os.rename(file_path, target_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(file_path, target_path)
+
+def organize_file(file_path, base_folder, categories, organize_by_date=False, date_sources=None, routes=None, dirs=None, temp_suffixes=TEMP_SUFFIXES):
+    """Move a file to its category folder, optionally by date, creating folders if needed.
+
+    Returns (success, message, target_path), with target_path None when the file was not moved.
+
+    Categories with routes are then mirrored to their extra destinations. A DirectoryCache in dirs
+    skips the access checks and makedirs for folders already seen.
+    """
+    try:
+        file_name = os.path.basename(file_path)
+        
+        if is_bundle_file(file_name):
+            return False, f"Skipped {file_name}: archive bundle", None
+        
+        with PROFILER.span("already_organized"):
+            already_organized = is_already_organized(file_path, base_folder, categories, temp_suffixes)
+        if already_organized:
+            return False, f"Skipped {file_name}: already in correct folder {get_category(file_name, categories, temp_suffixes)}", None
+        
+        category = get_category(file_name, categories, temp_suffixes)
+        if not category:
+            return False, f"Skipped {file_name}: temporary or unsupported file type", None
+        
+        target_folder = os.path.join(base_folder, category)
+        date_str = None
+        if organize_by_date:
+            try:
+                with PROFILER.span("file_date"):
+                    date_str = get_file_date(file_path, category, date_sources).strftime('%Y-%m-%d')
+                target_folder = os.path.join(target_folder, date_str)
+            except Exception as e:
+                logging.error("Error getting timestamp for %s: %s", file_name, e)
+                target_folder = os.path.join(base_folder, category)
+        
+        with PROFILER.span("access_check"):
+            if dirs:
+                writable = dirs.is_writable(os.path.dirname(file_path)) and dirs.is_writable(base_folder)
+            else:
+                writable = os.access(os.path.dirname(file_path), os.W_OK) and os.access(base_folder, os.W_OK)
+        if not writable:
+            raise PermissionError("No write access to source or destination folder")
+        
+        with PROFILER.span("makedirs"):
+            if dirs:
+                dirs.ensure(target_folder)
+            else:
+                os.makedirs(target_folder, exist_ok=True)
+        
+        with PROFILER.span("pick_target_name"):
+            target_path = reserve_target_path(target_folder, file_name)
+        try:
+            with PROFILER.span("move"):
+                if dirs:
+                    move_into_known_folder(file_path, target_path, dirs)
+                else:
+                    shutil.move(file_path, target_path)
+        finally:
+            release_target_path(target_path)
+        logging.info("Moved %s to %s", file_name, target_path)
+        message = f"Moved {file_name} to {category}{'/' + date_str if date_str else ''}"
+        category_routes = (routes or {}).get(category)
+        if category_routes:
+            with PROFILER.span("route"):
+                routed = fan_out_file(target_path, category_routes)
+            if routed:
+                message += f" and routed to {', '.join(f'{os.path.dirname(path)} ({action})' for path, action in routed)}"
+        return True, message, target_path
+    except PermissionError as e:
+        logging.error("Permission error moving %s: %s", file_name, e)
+        return False, f"Permission error moving {file_name}: {str(e)}. Try running as administrator.", None
+    except FileNotFoundError as e:
+        logging.error("File not found for %s: %s", file_name, e)
+        return False, f"File not found for {file_name}: {str(e)}", None
+    except Exception as e:
+        logging.error("Error moving %s: %s", file_name, e)
+        return False, f"Error moving {file_name}: {str(e)}", None
+
+def fsync_directory(path):
+    """Flush a directory's entries to disk where the platform allows opening directories."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Windows cannot open a directory this way
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logging.debug("Could not fsync %s: %s", path, e)
+    finally:
+        os.close(fd)
+
+# Bundles and their sidecar indexes share this prefix so the watchers never organize them
+BUNDLE_PREFIX = "_bundle_"
+BUNDLE_INDEX_SUFFIX = ".index.json"
+BUNDLE_PARTIAL_SUFFIX = ".partial"
+BUNDLE_CHUNK_SIZE = 1024 * 1024
+
+def is_bundle_file(file_name):
+    """Return True for archive bundles, their sidecar indexes and in-progress bundle files."""
+    return file_name.startswith(BUNDLE_PREFIX)
+
+def list_bundle(index_path):
+    """Return the member entries recorded in a bundle's sidecar index without opening the bundle."""
+    with open(index_path, 'r') as f:
+        return json.load(f)["files"]
+
+def _read_exact(reader, size):
+    """Read exactly size bytes from a stream, raising EOFError if it ends early."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = reader.read(size - len(data))
+        if not chunk:
+            raise EOFError("Unexpected end of bundle")
+        data += chunk
+    return bytes(data)
+
+def extract_from_bundle(bundle_path, member_name, dest_folder):
+    """Extract a single file from a bundle using its sidecar index and return the extracted path."""
+    index = list_bundle(bundle_path + BUNDLE_INDEX_SUFFIX)
+    if member_name not in index:
+        raise FileNotFoundError(f"{member_name} is not in bundle {os.path.basename(bundle_path)}")
+    dest_path = os.path.join(dest_folder, member_name)
+    if bundle_path.endswith(".tar.zst"):
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read tar.zst bundles")
+        # Each member was written as its own zstd frame, so decompress just that frame
+        with open(bundle_path, 'rb') as f, open(dest_path, 'wb') as out:
+            f.seek(index[member_name]["offset"])
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=False)
+            header = tarfile.TarInfo.frombuf(_read_exact(reader, tarfile.BLOCKSIZE), tarfile.ENCODING, "surrogateescape")
+            if header.type == tarfile.XHDTYPE:
+                # Skip the PAX extended header data and the real header that follows it
+                _read_exact(reader, -(-header.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE + tarfile.BLOCKSIZE)
+            remaining = index[member_name]["size"]
+            while remaining:
+                chunk = _read_exact(reader, min(BUNDLE_CHUNK_SIZE, remaining))
+                out.write(chunk)
+                remaining -= len(chunk)
+    else:
+        with zipfile.ZipFile(bundle_path) as zf, zf.open(member_name) as src, open(dest_path, 'wb') as out:
+            shutil.copyfileobj(src, out, BUNDLE_CHUNK_SIZE)
+    os.utime(dest_path, (index[member_name]["mtime"], index[member_name]["mtime"]))
+    return dest_path
+
+class ArchiveBundler:
+    """Pack cold small files in category folders into compressed bundles on a background thread."""
+    def __init__(self, settings, log_callback, monitored_folders=()):
+        self.categories = set(settings.get("categories", []))
+        self.format = settings.get("format", "zip")
+        if self.format == "tar.zst" and zstandard is None:
+            logging.warning("zstandard is not installed, falling back to zip bundles")
+            self.format = "zip"
+        self.max_file_size = settings.get("max_file_size", 256 * 1024)
+        self.min_age = settings.get("min_age_days", 30) * 86400
+        self.min_files = settings.get("min_files", 200)
+        self.max_bundle_files = settings.get("max_bundle_files", 10000)
+        self.interval = settings.get("interval", 3600)
+        self.log_callback = log_callback
+        # Category folders that already exist are swept even if nothing new lands in them
+        self.known_folders = {
+            os.path.join(folder, category)
+            for folder in monitored_folders for category in self.categories
+            if os.path.isdir(os.path.join(folder, category))
+        }
+        self.pending = set()
+        self.condition = threading.Condition()
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        """Start the background bundling thread."""
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logging.info("Started archive bundler (format=%s)", self.format)
+
+    def stop(self):
+        """Stop the background bundling thread, abandoning the bundle in progress; waits for it, so never call it on the Tk thread."""
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+        logging.info("Stopped archive bundler")
+
+    def notify(self, category_folder):
+        """Queue a category folder that just received a file for the next bundling pass."""
+        if os.path.basename(category_folder) not in self.categories:
+            return
+        with self.condition:
+            self.known_folders.add(category_folder)
+            self.pending.add(category_folder)
+
+    def _run(self):
+        """Wait for the bundling interval and then sweep every folder seen so far."""
+        while True:
+            with self.condition:
+                self.condition.wait(self.interval)
+                if not self.is_running:
+                    return
+                folders = self.pending | self.known_folders
+                self.pending = set()
+            # Bundling reads and compresses whole folders, so it waits for a quiet machine
+            while self.is_running and not LOAD.is_quiet():
+                with self.condition:
+                    self.condition.wait(30)
+            for folder in folders:
+                if not self.is_running:
+                    return
+                try:
+                    self.bundle_category(folder)
+                except Exception as e:
+                    if not self.is_running:
+                        logging.info("Stopped bundling %s: %s", folder, e)
+                        return
+                    logging.error("Error bundling %s: %s", folder, e)
+                    self.log_callback(f"Error bundling {folder}: {str(e)}")
+
+    def bundle_category(self, category_folder):
+        """Bundle the category folder and each of its date subfolders separately."""
+        folders = [category_folder]
+        with os.scandir(category_folder) as entries:
+            folders.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        for folder in folders:
+            if not self.is_running:
+                return
+            self.bundle_folder(folder)
+
+    def _cold_files(self, folder):
+        """Return (name, stat) for small files in a folder that have been neither modified nor moved there for the configured age.
+
+        organize_file keeps a file's mtime, so the change time, which a move updates, stands in for when it arrived.
+        """
+        cutoff = time.time() - self.min_age
+        cold = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if is_bundle_file(entry.name) or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_size <= self.max_file_size and max(stat.st_mtime, stat.st_ctime) < cutoff:
+                    cold.append((entry.name, stat))
+        return cold
+
+    def bundle_folder(self, folder):
+        """Pack the cold small files of one folder into bundles of at most max_bundle_files files."""
+        # The listing is finished before any file is removed, so the scan never sees its own deletions
+        candidates = self._cold_files(folder)
+        for start in range(0, len(candidates), self.max_bundle_files):
+            if not self.is_running:
+                return
+            batch = candidates[start:start + self.max_bundle_files]
+            if len(batch) >= self.max_bundle_files or len(batch) >= self.min_files:
+                self._write_bundle(folder, batch)
+
+    def _write_bundle(self, folder, members):
+        """Stream members into a new bundle and its sidecar index, then remove the originals."""
+        extension = ".tar.zst" if self.format == "tar.zst" else ".zip"
+        bundle_name = f"{BUNDLE_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{extension}"
+        bundle_path = os.path.join(folder, bundle_name)
+        partial_path = bundle_path + BUNDLE_PARTIAL_SUFFIX
+        index_path = bundle_path + BUNDLE_INDEX_SUFFIX
+        index = {}
+        try:
+            with open(partial_path, 'wb') as f:
+                if extension == ".zip":
+                    self._write_zip(f, folder, members, index)
+                else:
+                    self._write_tar_zst(f, folder, members, index)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(partial_path, bundle_path)
+            stats = dict(members)
+            for name in [name for name in index if not self._unchanged(folder, name, stats[name], index[name])]:
+                # Changed while it was being packed; the original stays and the stale copy is left unindexed
+                logging.info("Keeping %s, it changed while bundling", name)
+                del index[name]
+            with open(index_path + BUNDLE_PARTIAL_SUFFIX, 'w') as f:
+                json.dump({"bundle": bundle_name, "format": self.format, "files": index}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(index_path + BUNDLE_PARTIAL_SUFFIX, index_path)
+            # The bundle and index names must be durable before the originals go away
+            fsync_directory(folder)
+        except Exception:
+            for path in (partial_path, index_path + BUNDLE_PARTIAL_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+            # A published bundle without its index would be bundled again on the next pass
+            if os.path.exists(bundle_path) and not os.path.exists(index_path):
+                os.remove(bundle_path)
+            raise
+
+        removed = 0
+        for name in index:
+            if not self._unchanged(folder, name, stats[name], index[name]):
+                logging.warning("Not removing %s, it changed after it was bundled", name)
+                continue
+            try:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+            except OSError as e:
+                logging.error("Error removing bundled file %s: %s", name, e)
+        logging.info("Bundled %d files from %s into %s", removed, folder, bundle_name)
+        self.log_callback(f"Bundled {removed} files from {folder} into {bundle_name}")
+
+    def _check_running(self):
+        """Abandon the bundle being written once the bundler is stopped; _write_bundle removes the partial file."""
+        if not self.is_running:
+            raise RuntimeError("Archive bundler stopped")
+
+    def _unchanged(self, folder, name, stat, entry):
+        """Return True if a member still has the inode, mtime and size it was bundled with."""
+        try:
+            current = os.stat(os.path.join(folder, name), follow_symlinks=False)
+        except OSError:
+            return False
+        return (current.st_ino == stat.st_ino and current.st_mtime_ns == stat.st_mtime_ns
+                and current.st_size == entry["size"])
+
+    def _write_zip(self, f, folder, members, index):
+        """Write members into a zip bundle one chunk at a time."""
+        with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, stat in members:
+                self._check_running()
+                try:
+                    info = zipfile.ZipInfo(name, time.localtime(max(stat.st_mtime, 315532800))[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    offset = f.tell()
+                    copied = 0
+                    with open(os.path.join(folder, name), 'rb') as src, zf.open(info, 'w') as dst:
+                        while True:
+                            chunk = src.read(BUNDLE_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                            IO_THROTTLE.consume(len(chunk))
+                            copied += len(chunk)
+                except OSError as e:
+                    logging.warning("Skipped %s while bundling: %s", name, e)
+                    continue
+                index[name] = {"size": copied, "mtime": stat.st_mtime, "offset": offset}
+
+    def _write_tar_zst(self, f, folder, members, index):
+        """Write members as a tar stream where every member is its own zstd frame."""
+        compressor = zstandard.ZstdCompressor(level=10)
+        writer = compressor.stream_writer(f, closefd=False)
+        for name, stat in members:
+            self._check_running()
+            offset = f.tell()
+            try:
+                with open(os.path.join(folder, name), 'rb') as src:
+                    info = tarfile.TarInfo(name)
+                    info.size = stat.st_size
+                    info.mtime = stat.st_mtime
+                    writer.write(info.tobuf(format=tarfile.PAX_FORMAT))
+                    remaining = stat.st_size
+                    while remaining:
+                        chunk = src.read(min(BUNDLE_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise OSError(f"{name} shrank while bundling")
+                        writer.write(chunk)
+                        IO_THROTTLE.consume(len(chunk))
+                        remaining -= len(chunk)
+                    writer.write(b'\x00' * (-stat.st_size % tarfile.BLOCKSIZE))
+            except OSError as e:
+                # A partially written member cannot be taken back out of the stream
+                writer.flush(zstandard.FLUSH_FRAME)
+                raise RuntimeError(f"Failed to bundle {name}: {e}") from e
+            writer.flush(zstandard.FLUSH_FRAME)
+            index[name] = {"size": stat.st_size, "mtime": stat.st_mtime, "offset": offset}
+        writer.write(b'\x00' * tarfile.BLOCKSIZE * 2)
+        writer.flush(zstandard.FLUSH_FRAME)
+
+# Characters that turn an exclusion into a glob pattern instead of a folder path
+GLOB_CHARS = set('*?[')
+
+def is_glob_pattern(exclusion, base_folder=None):
+    """Return True if an exclusion is a glob pattern such as **/node_modules/** or *.part.
+
+    Absolute paths and paths that exist under base_folder are plain folders even if their names contain [, * or ?.
+    """
+    if os.path.isabs(exclusion) or (base_folder and os.path.exists(os.path.join(base_folder, exclusion))):
+        return False
+    return any(char in GLOB_CHARS for char in exclusion)
+
+def glob_to_regex(pattern):
+    """Translate a glob pattern matched against '/'-separated relative paths into a regex string."""
+    pattern = pattern.replace('\\', '/').strip('/')
+    if '/' not in pattern:
+        # A bare name such as *.part matches at any depth
+        pattern = '**/' + pattern
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                regex += re.escape(pattern[i])
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                regex += '[' + ('^' + body[1:] if body.startswith('!') else body) + ']'
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    # Matching a folder also excludes everything below it
+    return regex + '(?:/.*)?'
+
+class ExclusionMatcher:
+    """Exclusions compiled once into a component-wise folder trie plus one combined glob regex."""
+    EXCLUDED = object()
+
+    def __init__(self, base_folder, exclusions):
+        self.base_folder = os.path.normpath(base_folder)
+        self.trie = {}
+        patterns = []
+        for exclusion in exclusions:
+            if is_glob_pattern(exclusion, self.base_folder):
+                patterns.append(glob_to_regex(exclusion))
+            else:
+                node = self.trie
+                for part in self._components(os.path.join(self.base_folder, exclusion)):
+                    node = node.setdefault(part, {})
+                node[self.EXCLUDED] = True
+        flags = re.IGNORECASE if os.name == 'nt' else 0
+        self.regex = re.compile('|'.join(f'(?:{p})' for p in patterns), flags) if patterns else None
+        # Folders on the way to an excluded folder are watched non-recursively so the excluded subtree is never registered
+        self.spine = set()
+        node = self._find(self.base_folder)
+        if node is not None:
+            self._collect_spine(self.base_folder, node)
+
+    @staticmethod
+    def _components(path):
+        return [part for part in os.path.normcase(os.path.normpath(path)).split(os.sep) if part]
+
+    def _find(self, path):
+        """Return the trie node for a folder, or None if no exclusion lies at or below it."""
+        node = self.trie
+        for part in self._components(path):
+            if self.EXCLUDED in node:
+                return node
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _collect_spine(self, folder, node):
+        if self.EXCLUDED in node:
+            return
+        self.spine.add(os.path.normcase(folder))
+        for part, child in node.items():
+            self._collect_spine(os.path.join(folder, part), child)
+
+    def _matches_trie(self, path):
+        node = self.trie
+        for part in self._components(path):
+            node = node.get(part)
+            if node is None:
+                return False
+            if self.EXCLUDED in node:
+                return True
+        return False
+
+    def _relative(self, path):
+        try:
+            return os.path.relpath(path, self.base_folder).replace(os.sep, '/')
+        except ValueError:  # Different drive on Windows
+            return None
+
+    def is_excluded(self, path):
+        """Return True if a file path is excluded by a folder exclusion or a glob pattern."""
+        if self.trie and self._matches_trie(path):
+            return True
+        if self.regex:
+            relative = self._relative(path)
+            return relative is not None and self.regex.fullmatch(relative) is not None
+        return False
+
+    def is_excluded_dir(self, path):
+        """Return True if a folder and everything below it should be skipped."""
+        if self.trie and self._matches_trie(path):
+            return True
+        if self.regex:
+            relative = self._relative(path)
+            return relative is not None and self.regex.fullmatch(relative + '/') is not None
+        return False
+
+    def is_spine(self, folder):
+        """Return True if a folder is watched non-recursively because an excluded folder lies below it."""
+        return os.path.normcase(os.path.normpath(folder)) in self.spine
+
+    def watch_plan(self, recursive):
+        """Return (folder, recursive) watches that cover the base folder without entering excluded folders."""
+        if not recursive or not self.spine:
+            return [(self.base_folder, recursive)]
+        plan = []
+        stack = [self.base_folder]
+        while stack:
+            folder = stack.pop()
+            if not self.is_spine(folder):
+                plan.append((folder, True))
+                continue
+            plan.append((folder, False))
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and not self.is_excluded_dir(entry.path):
+                            stack.append(entry.path)
+            except OSError as e:
+                logging.warning("Error listing %s for watch registration: %s", folder, e)
+        return plan
+
+    def walk(self, folder, on_folder=None):
+        """Yield os.DirEntry objects for files below a folder, pruning excluded subtrees.
+
+        on_folder, if given, is called as on_folder(folder, False) before each folder is listed and as
+        on_folder(folder, True) once all of its files have been yielded.
+        """
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            if on_folder:
+                on_folder(current, False)
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self.is_excluded_dir(entry.path):
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not self.is_excluded(entry.path):
+                            yield entry
+            except OSError as e:
+                logging.warning("Error scanning %s: %s", current, e)
+            if on_folder:
+                on_folder(current, True)
+
+class ReconcileWalk:
+    """How far one statistics reconcile has walked, so adds and removes made meanwhile are neither lost nor counted twice.
+
+    Changes in folders the walk has not reached are left to the walk; changes in folders it has finished
+    are replayed; in the folder being walked, only files the walk has not counted (adds) or has (removes).
+    A change recorded only after the walk finished listing its folder is still off by one until the next reconcile.
+    """
+    __slots__ = ("listed", "folder", "seen", "unseen", "changes")
+
+    def __init__(self):
+        self.listed = set()
+        self.folder = None
+        self.seen = set()
+        self.unseen = {}
+        self.changes = []
+
+    def note(self, folder, name, change):
+        """Record an add or remove of folder/name made during the walk; a change without a path is always replayed."""
+        if folder is None or folder in self.listed:
+            self.changes.append(change)
+        elif folder == self.folder:
+            if change[0] == "add":
+                if name not in self.seen:
+                    self.unseen[name] = change
+            elif name in self.seen:
+                self.seen.discard(name)
+                self.changes.append(change)
+            else:
+                self.unseen.pop(name, None)
+
+    def start(self, folder):
+        """Note that the walk is about to list a folder."""
+        self.folder, self.seen, self.unseen = folder, set(), {}
+
+    def visit(self, name):
+        """Note that the walk counted a file in the folder being listed."""
+        self.seen.add(name)
+        self.unseen.pop(name, None)
+
+    def finish(self, folder):
+        """Note that the walk has counted every file in a folder; adds there it never reached are replayed."""
+        self.listed.add(folder)
+        self.changes.extend(self.unseen.values())
+        self.folder, self.seen, self.unseen = None, set(), {}
+
+class FolderStatsIndex:
+    """Persistent per-folder, per-category file statistics kept current from organizer moves and deletes."""
+    def __init__(self, stats_file='folder_stats.json', reconcile_interval=6 * 3600):
+        self.stats_file = stats_file
+        self.reconcile_interval = reconcile_interval
+        self.folders = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.reconciling = {}  # base_folder -> ReconcileWalks in progress
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.load()
+
+    @staticmethod
+    def _empty_entry():
+        return {"count": 0, "bytes": 0, "oldest": None, "newest": None, "extensions": {}}
+
+    def load(self):
+        """Load the saved index so statistics are available before any scan."""
+        try:
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r') as f:
+                    self.folders = json.load(f).get("folders", {})
+                logging.info("Loaded folder statistics for %d folders from %s", len(self.folders), self.stats_file)
+        except Exception as e:
+            logging.error("Error loading folder statistics %s: %s", self.stats_file, e)
+            self.folders = {}
+
+    def save(self):
+        """Write the index to disk if it changed since the last save."""
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = json.dumps({"updated": time.time(), "folders": self.folders})
+            self.dirty = False
+        try:
+            with open(self.stats_file + ".tmp", 'w') as f:
+                f.write(snapshot)
+            os.replace(self.stats_file + ".tmp", self.stats_file)
+        except Exception as e:
+            logging.error("Error saving folder statistics %s: %s", self.stats_file, e)
+
+    def record_add(self, base_folder, category, size, mtime, ext, path=None):
+        """Count a file that was moved into a category folder."""
+        with self.lock:
+            self._add(self.folders.setdefault(base_folder, {}).setdefault(category, self._empty_entry()), size, mtime, ext)
+            self._note_change(base_folder, path, ("add", category, size, mtime, ext))
+            self.dirty = True
+
+    def _add(self, entry, size, mtime, ext):
+        entry["count"] += 1
+        entry["bytes"] += size
+        entry["oldest"] = mtime if entry["oldest"] is None else min(entry["oldest"], mtime)
+        entry["newest"] = mtime if entry["newest"] is None else max(entry["newest"], mtime)
+        self._count_extension(entry, ext, 1)
+
+    @staticmethod
+    def _count_extension(entry, ext, delta):
+        count = entry["extensions"].get(ext, 0) + delta
+        if count:
+            entry["extensions"][ext] = count
+        else:
+            entry["extensions"].pop(ext, None)
+
+    def record_remove(self, base_folder, category, ext, size=None, path=None):
+        """Uncount a file that left a category folder; without a size the category average is used.
+
+        A removal can arrive before the matching record_add (a file deleted right after it was moved), so
+        the count may dip below zero until that add lands.
+        """
+        with self.lock:
+            entry = self.folders.setdefault(base_folder, {}).setdefault(category, self._empty_entry())
+            if size is None:
+                size = entry["bytes"] // entry["count"] if entry["count"] > 0 else 0
+            self._remove(entry, ext, size)
+            self._note_change(base_folder, path, ("remove", category, ext, size))
+            # Oldest/newest can only widen incrementally; the next reconcile narrows them again
+            self.dirty = True
+
+    def _remove(self, entry, ext, size):
+        entry["count"] -= 1
+        if entry["count"] > 0:
+            entry["bytes"] = max(0, entry["bytes"] - size)
+        else:
+            entry["bytes"] = 0 if entry["count"] == 0 else entry["bytes"] - size
+        self._count_extension(entry, ext, -1)
+
+    @staticmethod
+    def _split(path):
+        folder, name = os.path.split(path)
+        return os.path.normcase(os.path.normpath(folder)), os.path.normcase(name)
+
+    def _note_change(self, base_folder, path, change):
+        """Pass a change to every reconcile walk of the folder in progress; called with the lock held."""
+        walks = self.reconciling.get(base_folder)
+        if walks:
+            folder, name = self._split(path) if path else (None, None)
+            for walk in walks:
+                walk.note(folder, name, change)
+
+    def _replay(self, folders, changes):
+        for change in changes:
+            entry = folders.setdefault(change[1], self._empty_entry())
+            if change[0] == "add":
+                self._add(entry, *change[2:])
+            else:
+                self._remove(entry, *change[2:])
+
+    def reconcile(self, base_folder, category_names, matcher=None, stop_event=None):
+        """Rebuild the statistics of one monitored folder from a scan of its category folders.
+
+        Adds and removes recorded during the scan are replayed onto the result. Returns False, keeping the
+        old statistics, if stop_event was set before the scan finished.
+        """
+        matcher = matcher or ExclusionMatcher(base_folder, [])
+        walk = ReconcileWalk()
+        with self.lock:
+            self.reconciling.setdefault(base_folder, []).append(walk)
+        try:
+            fresh = self._scan(base_folder, category_names, matcher, stop_event, walk)
+            if fresh is None:
+                logging.info("Stopped reconciling statistics for %s", base_folder)
+                return False
+            with self.lock:
+                self._replay(fresh, walk.changes)
+                self.folders[base_folder] = fresh
+                self.dirty = True
+        finally:
+            with self.lock:
+                self.reconciling[base_folder].remove(walk)
+                if not self.reconciling[base_folder]:
+                    del self.reconciling[base_folder]
+        logging.info("Reconciled statistics for %s: %d files", base_folder, sum(e["count"] for e in fresh.values()))
+        return True
+
+    def _scan(self, base_folder, category_names, matcher, stop_event, walk):
+        """Return fresh statistics for the category folders of a monitored folder, or None if stop_event was set."""
+        def on_folder(folder, listed):
+            folder = os.path.normcase(os.path.normpath(folder))
+            with self.lock:
+                if listed:
+                    walk.finish(folder)
+                else:
+                    walk.start(folder)
+
+        fresh = {}
+        for category in category_names:
+            category_folder = os.path.join(base_folder, category)
+            if not os.path.isdir(category_folder):
+                continue
+            entry = self._empty_entry()
+            for item in matcher.walk(category_folder, on_folder):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                # Under the lock, so a change to this file lands wholly before or after the walk counts it
+                with self.lock:
+                    try:
+                        stat = item.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    walk.visit(os.path.normcase(item.name))
+                ext = os.path.splitext(item.name)[1].lower()
+                entry["count"] += 1
+                entry["bytes"] += stat.st_size
+                entry["oldest"] = stat.st_mtime if entry["oldest"] is None else min(entry["oldest"], stat.st_mtime)
+                entry["newest"] = stat.st_mtime if entry["newest"] is None else max(entry["newest"], stat.st_mtime)
+                entry["extensions"][ext] = entry["extensions"].get(ext, 0) + 1
+            fresh[category] = entry
+        return fresh
+
+    def summary(self, top_extensions=3):
+        """Return one row per folder and category for display, largest categories first.
+
+        Counts and sizes that record_remove pushed below zero are shown as zero until the matching add arrives.
+        """
+        rows = []
+        with self.lock:
+            for base_folder, categories in self.folders.items():
+                for category, entry in categories.items():
+                    top = sorted((item for item in entry["extensions"].items() if item[1] > 0), key=lambda item: -item[1])[:top_extensions]
+                    rows.append({
+                        "folder": base_folder,
+                        "category": category,
+                        "count": max(0, entry["count"]),
+                        "bytes": max(0, entry["bytes"]),
+                        "oldest": entry["oldest"],
+                        "newest": entry["newest"],
+                        "top_extensions": top
+                    })
+        rows.sort(key=lambda row: (row["folder"], -row["bytes"]))
+        return rows
+
+    def format_summary(self):
+        """Return the summary as a plain-text table."""
+        lines = [f"{'Category':<14}{'Files':>10}{'Size (MB)':>12}  {'Oldest':<11}{'Newest':<11}Top extensions"]
+        current_folder = None
+        for row in self.summary():
+            if row["folder"] != current_folder:
+                current_folder = row["folder"]
+                lines.append(current_folder)
+            oldest = datetime.fromtimestamp(row["oldest"]).strftime('%Y-%m-%d') if row["oldest"] else '-'
+            newest = datetime.fromtimestamp(row["newest"]).strftime('%Y-%m-%d') if row["newest"] else '-'
+            top = ', '.join(f"{ext or '(none)'} ({count})" for ext, count in row["top_extensions"])
+            lines.append(f"  {row['category']:<12}{row['count']:>10}{row['bytes'] / 1048576:>12.1f}  {oldest:<11}{newest:<11}{top}")
+        if current_folder is None:
+            lines.append("No statistics collected yet.")
+        return "\n".join(lines)
+
+    def start(self, folders):
+        """Start the background thread that saves changes and periodically reconciles (base_folder, category_names, matcher) entries."""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(folders,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the background thread and save the index; waits for the thread, so never call it on the Tk thread."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.save()
+
+    def _run(self, folders):
+        """Reconcile folders missing from the index immediately, then on every interval."""
+        last_reconcile = {base_folder: 0 if base_folder not in self.folders else time.time() for base_folder, _, _ in folders}
+        while not self.stop_event.is_set():
+            for base_folder, category_names, matcher in folders:
+                if self.stop_event.is_set():
+                    break
+                if time.time() - last_reconcile[base_folder] >= self.reconcile_interval:
+                    # Only folders missing from the index are reconciled while the machine is busy
+                    if last_reconcile[base_folder] and not LOAD.is_quiet():
+                        continue
+                    try:
+                        if not self.reconcile(base_folder, category_names, matcher, self.stop_event):
+                            break
+                    except Exception as e:
+                        logging.error("Error reconciling statistics for %s: %s", base_folder, e)
+                    last_reconcile[base_folder] = time.time()
+            self.save()
+            self.stop_event.wait(30)
+
+class WriteCompletionDetector:
+    """Decide when a file has finished being written, using close events, size/mtime stability, writer detection and lock probing."""
+    INITIAL_DELAY = 0.01
+    MAX_DELAY = 2.0
+    # Time a file must stay unchanged, growing with its size and capped at MAX_STABILITY
+    MIN_STABILITY = 0.02
+    MAX_STABILITY = 5.0
+    STABILITY_BYTES_PER_SECOND = 256 * 1024 * 1024
+    # Files at least this big are also checked for open writers when no close event was seen
+    WRITER_SCAN_THRESHOLD = 1024 * 1024
+    # Give up when a file stays unchanged but locked or open for writing this long
+    IDLE_TIMEOUT = 600
+    MAX_TRACKED = 10000
+    # One /proc scan answers every is_open_for_write call made within this many seconds
+    WRITER_SCAN_TTL = 0.5
+    _writer_scan_lock = threading.Lock()
+    _writer_scan_at = None
+    _writer_inodes = frozenset()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modified = OrderedDict()
+        self.closed = OrderedDict()
+        self.waiters = {}
+        self.supports_close_events = sys.platform.startswith('linux')
+
+    def _remember(self, table, file_path):
+        table[file_path] = time.monotonic()
+        table.move_to_end(file_path)
+        if len(table) > self.MAX_TRACKED:
+            table.popitem(last=False)
+
+    def note_modified(self, file_path):
+        """Record a write to a file."""
+        with self.lock:
+            self._remember(self.modified, file_path)
+
+    @staticmethod
+    def _file_key(file_path):
+        """Key waiters by (device, inode) so a rename between create and close still wakes them."""
+        try:
+            stat = os.stat(file_path)
+            return stat.st_dev, stat.st_ino
+        except OSError:
+            return file_path
+
+    def note_closed(self, file_path):
+        """Record that a writer closed a file (inotify IN_CLOSE_WRITE) and have its readiness check run again now."""
+        key = self._file_key(file_path)
+        with self.lock:
+            self._remember(self.closed, file_path)
+            check = self.waiters.get(key)
+        if check and check.stage:
+            check.stage.wake(check)
+
+    def forget(self, file_path):
+        """Drop the write history of a file that has been handled."""
+        with self.lock:
+            self.modified.pop(file_path, None)
+            self.closed.pop(file_path, None)
+
+    def _closed_since_modified(self, file_path):
+        with self.lock:
+            closed = self.closed.get(file_path)
+            return closed is not None and closed >= self.modified.get(file_path, 0)
+
+    @staticmethod
+    def is_locked(file_path):
+        """Return True if another process holds the file open without write sharing (Windows)."""
+        if os.name != 'nt':
+            return False
+        try:
+            os.close(os.open(file_path, os.O_RDWR | os.O_BINARY))
+            return False
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _scan_writers():
+        """Return the (device, inode) of every regular file some process visible in /proc has open for writing."""
+        inodes = set()
+        try:
+            pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        except OSError:
+            return inodes
+        for pid in pids:
+            fd_dir = f'/proc/{pid}/fd'
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    fd_stat = os.stat(f'{fd_dir}/{fd}')
+                    if not S_ISREG(fd_stat.st_mode):
+                        continue
+                    with open(f'/proc/{pid}/fdinfo/{fd}', 'r') as f:
+                        for line in f:
+                            if line.startswith('flags:'):
+                                if int(line.split()[1], 8) & (os.O_WRONLY | os.O_RDWR):
+                                    inodes.add((fd_stat.st_dev, fd_stat.st_ino))
+                                break
+                except (OSError, ValueError):
+                    continue
+        return inodes
+
+    @classmethod
+    def is_open_for_write(cls, file_path):
+        """Return True if a process visible in /proc has the file open for writing (Linux)."""
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            target = os.stat(file_path)
+        except OSError:
+            return False
+        with cls._writer_scan_lock:
+            now = time.monotonic()
+            if cls._writer_scan_at is None or now - cls._writer_scan_at > cls.WRITER_SCAN_TTL:
+                cls._writer_inodes = frozenset(cls._scan_writers())
+                cls._writer_scan_at = time.monotonic()
+            return (target.st_dev, target.st_ino) in cls._writer_inodes
+
+    def begin(self, file_path, expect_close=False, keep_waiting=lambda: True):
+        """Start tracking a file until it is complete and return the ReadinessCheck to pass to poll().
+
+        expect_close marks files that were just created, for which a close event is due on platforms that report them.
+        """
+        check = ReadinessCheck(self, file_path, expect_close and self.supports_close_events, keep_waiting)
+        with self.lock:
+            self.waiters[check.key] = check
+        return check
+
+    def end(self, check):
+        """Stop tracking a file started with begin()."""
+        with self.lock:
+            if self.waiters.get(check.key) is check:
+                del self.waiters[check.key]
+
+    def poll(self, check):
+        """Look at a file once; return True when it is complete, False once it stayed unfinished for IDLE_TIMEOUT
+        or keep_waiting() turned False, and None while undecided, with check.wait set to the seconds until the next look.
+        """
+        if not check.keep_waiting():
+            return False
+        file_path = check.file_path
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return True  # Gone or unreadable; organizing it reports why
+        if self._closed_since_modified(file_path) and not self.is_locked(file_path):
+            return True
+        now = time.monotonic()
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if signature != check.previous:
+            check.previous = signature
+            check.stable_since = check.last_change = now
+            check.delay = self.INITIAL_DELAY
+        else:
+            required = min(self.MAX_STABILITY, self.MIN_STABILITY + stat.st_size / self.STABILITY_BYTES_PER_SECOND)
+            if now - check.stable_since >= required and not self.is_locked(file_path):
+                if (stat.st_size < self.WRITER_SCAN_THRESHOLD and not check.scan_all) or not self.is_open_for_write(file_path):
+                    return True
+            if now - check.last_change >= self.IDLE_TIMEOUT:
+                return False
+        check.wait = check.delay
+        check.delay = min(check.delay * 2, self.MAX_DELAY)
+        return None
+
+    @staticmethod
+    def retry_delay(attempt):
+        """Exponential backoff between organize attempts after an error."""
+        return min(WriteCompletionDetector.MAX_DELAY * 4, 0.1 * 2 ** attempt)
+
+class ReadinessCheck:
+    """Progress of one file through WriteCompletionDetector.poll()."""
+    __slots__ = ('detector', 'file_path', 'key', 'scan_all', 'keep_waiting', 'previous', 'stable_since',
+                 'last_change', 'delay', 'wait', 'stage', 'on_done', 'due')
+
+    def __init__(self, detector, file_path, scan_all, keep_waiting):
+        self.detector = detector
+        self.file_path = file_path
+        self.key = detector._file_key(file_path)
+        self.scan_all = scan_all
+        self.keep_waiting = keep_waiting
+        self.previous = None
+        self.stable_since = self.last_change = time.monotonic()
+        self.delay = self.wait = detector.INITIAL_DELAY
+        self.stage = None
+        self.on_done = None
+        self.due = None
+
+class ReadinessStage:
+    """One thread that polls files still being written and calls back once each is complete or given up.
+
+    Waiting here instead of in the organize workers means a slow download never holds a lane worker,
+    however few workers the load monitor leaves running.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = []  # (due, order, check); entries whose due no longer matches the check are stale
+        self.order = itertools.count()
+        self.active = 0
+        self.is_running = True
+        self.thread = None
+
+    def __len__(self):
+        return self.active
+
+    def watch(self, check, on_done):
+        """Poll a check started with WriteCompletionDetector.begin() and call on_done(ready) when it is decided."""
+        check.stage = self
+        check.on_done = on_done
+        with self.condition:
+            if not self.is_running:
+                check.detector.end(check)
+                return
+            self.active += 1
+            self._schedule(check, 0)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="readiness", daemon=True)
+                self.thread.start()
+
+    def wake(self, check):
+        """Poll a check right away, e.g. after its writer closed the file."""
+        with self.condition:
+            if self.is_running and check.due is not None and check.due > time.monotonic():
+                self._schedule(check, 0)
+
+    def _schedule(self, check, delay):
+        check.due = time.monotonic() + delay
+        heapq.heappush(self.heap, (check.due, next(self.order), check))
+        self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.is_running:
+                        return
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    due, _, check = self.heap[0]
+                    if due != check.due:
+                        heapq.heappop(self.heap)
+                        continue
+                    now = time.monotonic()
+                    if due > now:
+                        self.condition.wait(due - now)
+                        continue
+                    heapq.heappop(self.heap)
+                    check.due = None
+                    break
+            try:
+                ready = check.detector.poll(check)
+            except Exception as e:
+                logging.error("Error checking whether %s is complete: %s", check.file_path, e)
+                ready = True
+            if ready is None:
+                with self.condition:
+                    self._schedule(check, check.wait)
+                continue
+            check.detector.end(check)
+            with self.condition:
+                self.active -= 1
+            try:
+                check.on_done(ready)
+            except Exception as e:
+                logging.error("Error handing over %s: %s", check.file_path, e)
+
+    def shutdown(self):
+        """Stop polling and drop every pending check."""
+        with self.condition:
+            self.is_running = False
+            self.heap.clear()
+            self.active = 0
+            self.condition.notify_all()
+
+class RenameCorrelator:
+    """Pair delete events with later create events that are really renames, in bounded time-bucketed memory."""
+    WINDOW = 5.0
+    BUCKET_WIDTH = 1.0
+    MAX_PENDING = 20000
+    MAX_SEEN = 50000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (folder, size, inode) for files whose stat was seen, else (folder, extension) -> deque of (path, time)
+        self.index = {}
+        self.buckets = deque()
+        self.pending = 0
+        self.seen = OrderedDict()
+
+    def note_seen(self, file_path, stat):
+        """Remember the size and inode of a file so its deletion can be matched precisely."""
+        with self.lock:
+            self.seen[file_path] = (stat.st_size, stat.st_ino or None)
+            self.seen.move_to_end(file_path)
+            if len(self.seen) > self.MAX_SEEN:
+                self.seen.popitem(last=False)
+
+    @staticmethod
+    def _key(file_path, size_inode):
+        folder = os.path.dirname(file_path)
+        if size_inode is None:
+            return (folder, os.path.splitext(file_path)[1].lower())
+        return (folder,) + size_inode
+
+    def note_deleted(self, file_path, size_inode=None):
+        """Index a deleted file for rename matching and return its last known size, if any."""
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            seen = self.seen.pop(file_path, None)
+            size_inode = size_inode or seen
+            key = self._key(file_path, size_inode)
+            self.index.setdefault(key, deque()).append((file_path, now))
+            bucket_id = int(now // self.BUCKET_WIDTH)
+            if not self.buckets or self.buckets[-1][0] != bucket_id:
+                self.buckets.append((bucket_id, []))
+            self.buckets[-1][1].append(key)
+            self.pending += 1
+            while self.pending > self.MAX_PENDING:
+                self._drop_oldest_bucket()
+        return size_inode[0] if size_inode else None
+
+    def match_created(self, file_path, stat=None):
+        """Return the deleted path a new file was renamed from, or None; each deletion matches at most once.
+
+        A file with a known size and inode only matches deletions with the same size and inode; the
+        folder and extension key is left to files whose stat is unknown.
+        """
+        now = time.monotonic()
+        key = self._key(file_path, None if stat is None else (stat.st_size, stat.st_ino or None))
+        with self.lock:
+            self._evict(now)
+            entries = self.index.get(key)
+            if entries:
+                deleted_path, _ = entries.popleft()
+                if not entries:
+                    del self.index[key]
+                self.pending -= 1
+                return deleted_path
+        return None
+
+    def _evict(self, now):
+        oldest_live = int((now - self.WINDOW) // self.BUCKET_WIDTH)
+        while self.buckets and self.buckets[0][0] < oldest_live:
+            self._drop_oldest_bucket()
+
+    def _drop_oldest_bucket(self):
+        bucket_id, keys = self.buckets.popleft()
+        for key in keys:
+            entries = self.index.get(key)
+            # Entries already matched are gone, so only drop those that really belong to this bucket
+            while entries and int(entries[0][1] // self.BUCKET_WIDTH) <= bucket_id:
+                entries.popleft()
+                self.pending -= 1
+            if entries is not None and not entries:
+                del self.index[key]
+
+class FileCatalog:
+    """Compact in-memory catalog of the files in the monitored trees, stored as array-backed columns.
+
+    Folder paths are interned in a table and file names packed into one byte buffer, so a file costs
+    about 40 bytes of columns and per-folder row lists plus its name and an open-addressing hash slot
+    used to find its row. It is saved with the watcher state and refreshed folder by folder at startup.
+    """
+    DELETED = 0xFFFF
+    EMPTY_SLOT = -1
+    FREE_SLOT = -2
+    MAGIC = b'FOFC'
+    VERSION = 1
+    # Columns saved to disk in this order; path hashes are per process and recomputed on load
+    SAVED_COLUMNS = ('name_offset', 'name_length', 'dir_id', 'size', 'mtime', 'inode', 'category')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.dirs = []
+        self.dir_ids = {}
+        self.category_table = []
+        self.category_ids = {}
+        self.names = bytearray()
+        self.name_offset = array('I')
+        self.name_length = array('H')
+        self.dir_id = array('I')
+        self.size = array('Q')
+        self.mtime = array('I')
+        self.inode = array('Q')
+        self.category = array('H')
+        self.path_hash = array('I')
+        self.dir_rows = {}  # dir_id -> rows appended in that folder, including rows deleted since
+        self.saved_mtimes = {}  # dir_id -> folder mtime_ns when the catalog was last saved, after load()
+        self.slots = array('i', [self.EMPTY_SLOT]) * 1024
+        self.used_slots = 0
+        self.live = 0
+
+    @staticmethod
+    def _hash(file_path):
+        return hash(file_path) & 0xFFFFFFFF
+
+    def _intern_dir(self, folder):
+        dir_id = self.dir_ids.get(folder)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(folder)
+            self.dir_ids[folder] = dir_id
+        return dir_id
+
+    def _intern_category(self, category):
+        category_id = self.category_ids.get(category)
+        if category_id is None:
+            category_id = len(self.category_table)
+            self.category_table.append(category)
+            self.category_ids[category] = category_id
+        return category_id
+
+    def _path(self, row):
+        offset = self.name_offset[row]
+        name = os.fsdecode(bytes(self.names[offset:offset + self.name_length[row]]))
+        return os.path.join(self.dirs[self.dir_id[row]], name)
+
+    def _find(self, file_path, path_hash):
+        """Return (slot, row) for a path, or (first reusable slot, None) if it is not cataloged."""
+        mask = len(self.slots) - 1
+        slot = path_hash & mask
+        reusable = None
+        while True:
+            row = self.slots[slot]
+            if row == self.EMPTY_SLOT:
+                return (slot if reusable is None else reusable), None
+            if row == self.FREE_SLOT:
+                if reusable is None:
+                    reusable = slot
+            elif self.path_hash[row] == path_hash and self._path(row) == file_path:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _grow_slots(self):
+        """Rebuild the hash table without freed slots, sized to stay at most a third full."""
+        size = 1024
+        while size < self.live * 3:
+            size *= 2
+        self.slots = array('i', [self.EMPTY_SLOT]) * size
+        self.used_slots = 0
+        mask = size - 1
+        for row, path_hash in enumerate(self.path_hash):
+            if self.category[row] == self.DELETED:
+                continue
+            slot = path_hash & mask
+            while self.slots[slot] != self.EMPTY_SLOT:
+                slot = (slot + 1) & mask
+            self.slots[slot] = row
+            self.used_slots += 1
+
+    def _append(self, slot, file_path, path_hash, stat, category):
+        folder, name = os.path.split(file_path)
+        encoded = os.fsencode(name)[:0xFFFF]
+        row = len(self.size)
+        self.name_offset.append(len(self.names))
+        self.name_length.append(len(encoded))
+        self.names += encoded
+        dir_id = self._intern_dir(folder)
+        self.dir_id.append(dir_id)
+        self.dir_rows.setdefault(dir_id, array('I')).append(row)
+        self.size.append(stat.st_size)
+        self.mtime.append(min(max(int(stat.st_mtime), 0), 0xFFFFFFFF))
+        self.inode.append(stat.st_ino or 0)
+        self.category.append(self._intern_category(category))
+        self.path_hash.append(path_hash)
+        if self.slots[slot] == self.EMPTY_SLOT:
+            self.used_slots += 1
+        self.slots[slot] = row
+        self.live += 1
+        if self.used_slots * 2 > len(self.slots):
+            self._grow_slots()
+
+    def add(self, file_path, stat, category):
+        """Add a file or update its size, mtime, inode and category."""
+        path_hash = self._hash(file_path)
+        with self.lock:
+            slot, row = self._find(file_path, path_hash)
+            if row is None:
+                self._append(slot, file_path, path_hash, stat, category)
+                return
+            self.size[row] = stat.st_size
+            self.mtime[row] = min(max(int(stat.st_mtime), 0), 0xFFFFFFFF)
+            self.inode[row] = stat.st_ino or 0
+            self.category[row] = self._intern_category(category)
+
+    def remove(self, file_path):
+        """Remove a file and return its last known (size, inode), or None if it was not cataloged."""
+        path_hash = self._hash(file_path)
+        with self.lock:
+            slot, row = self._find(file_path, path_hash)
+            if row is None:
+                return None
+            self.slots[slot] = self.FREE_SLOT
+            self.category[row] = self.DELETED
+            self.live -= 1
+            known = (self.size[row], self.inode[row] or None)
+            if len(self.size) > 1024 and self.live < len(self.size) // 2:
+                self._compact()
+            return known
+
+    def move(self, src_path, dest_path, category):
+        """Record a rename, keeping the file's size, mtime and inode."""
+        path_hash = self._hash(src_path)
+        with self.lock:
+            slot, row = self._find(src_path, path_hash)
+            if row is None:
+                return False
+            stat = os.stat_result((0, self.inode[row], 0, 0, 0, 0, self.size[row], 0, self.mtime[row], 0))
+        self.remove(src_path)
+        self.add(dest_path, stat, category)
+        return True
+
+    def remove_tree(self, folder):
+        """Remove every file below a folder, e.g. after the folder was deleted or moved away."""
+        prefix = os.path.join(folder, '')
+        with self.lock:
+            dir_ids = [dir_id for path, dir_id in self.dir_ids.items() if path == folder or path.startswith(prefix)]
+            removed = 0
+            for dir_id in dir_ids:
+                for row in self.dir_rows.pop(dir_id, ()):
+                    if self.category[row] == self.DELETED:
+                        continue
+                    self._free_slot(row)
+                    self.category[row] = self.DELETED
+                    removed += 1
+            self.live -= removed
+            # Deleted rows stay as tombstones until half the table is dead, as with single removals
+            if removed and len(self.size) > 1024 and self.live < len(self.size) // 2:
+                self._compact()
+            return removed
+
+    def _free_slot(self, row):
+        """Turn the hash slot pointing at a live row into a reusable tombstone."""
+        mask = len(self.slots) - 1
+        slot = self.path_hash[row] & mask
+        while self.slots[slot] != row:
+            slot = (slot + 1) & mask
+        self.slots[slot] = self.FREE_SLOT
+
+    def _compact(self):
+        """Drop deleted rows and rebuild the name buffer and hash table."""
+        old = (self.dirs, self.names, self.name_offset, self.name_length, self.dir_id, self.size,
+               self.mtime, self.inode, self.category, self.path_hash, self.category_table)
+        dirs, names, name_offset, name_length, dir_id, size, mtime, inode, category, path_hash, category_table = old
+        self._reset()
+        for row in range(len(size)):
+            if category[row] == self.DELETED:
+                continue
+            encoded = names[name_offset[row]:name_offset[row] + name_length[row]]
+            self.name_offset.append(len(self.names))
+            self.name_length.append(len(encoded))
+            self.names += encoded
+            new_dir_id = self._intern_dir(dirs[dir_id[row]])
+            self.dir_rows.setdefault(new_dir_id, array('I')).append(len(self.dir_id))
+            self.dir_id.append(new_dir_id)
+            self.size.append(size[row])
+            self.mtime.append(mtime[row])
+            self.inode.append(inode[row])
+            self.category.append(self._intern_category(category_table[category[row]]))
+            self.path_hash.append(path_hash[row])
+            self.live += 1
+        self._grow_slots()
+
+    def scan(self, base_folder, matcher, categories, temp_suffixes=TEMP_SUFFIXES):
+        """Catalog every file below a monitored folder, skipping excluded subtrees."""
+        added = self._scan_tree(base_folder, matcher, categories, temp_suffixes)
+        logging.info("Cataloged %d files under %s (%.1f bytes per file)", added, base_folder, self.bytes_per_file())
+        return added
+
+    def _scan_tree(self, folder, matcher, categories, temp_suffixes, skip_dirs=None):
+        """Catalog the files below a folder; every folder visited is interned so a saved catalog knows its mtime."""
+        added = 0
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            self.note_folder(current)
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not matcher.is_excluded_dir(entry.path) and not (skip_dirs and entry.path in skip_dirs):
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not matcher.is_excluded(entry.path):
+                            self._add_entry(entry, categories, temp_suffixes)
+                            added += 1
+            except OSError as e:
+                logging.warning("Error scanning %s: %s", current, e)
+        return added
+
+    def _add_entry(self, entry, categories, temp_suffixes):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return
+        # DirEntry.stat() has no inode on Windows; inode() fetches it from the same directory read
+        if not stat.st_ino:
+            stat = os.stat_result((stat.st_mode, entry.inode(), 0, 0, 0, 0, stat.st_size, 0, stat.st_mtime, 0))
+        self.add(entry.path, stat, self.category_of(entry.name, categories, temp_suffixes))
+
+    def note_folder(self, folder):
+        """Intern a folder even while it holds no files, so changes to it are noticed after a restart."""
+        with self.lock:
+            self._intern_dir(folder)
+
+    def refresh(self, base_folder, matcher, categories, temp_suffixes=TEMP_SUFFIXES):
+        """Bring a loaded catalog up to date below a monitored folder, listing only folders whose mtime changed."""
+        prefix = os.path.join(base_folder, '')
+        with self.lock:
+            known = [(dir_id, folder) for folder, dir_id in self.dir_ids.items() if folder == base_folder or folder.startswith(prefix)]
+        if not known:
+            return self.scan(base_folder, matcher, categories, temp_suffixes)
+        known_folders = {folder for _, folder in known}
+        relisted = added = 0
+        for dir_id, folder in known:
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns is not None and mtime_ns == self.saved_mtimes.get(dir_id):
+                continue
+            with self.lock:
+                for row in self.dir_rows.pop(dir_id, ()):
+                    if self.category[row] != self.DELETED:
+                        self._free_slot(row)
+                        self.category[row] = self.DELETED
+                        self.live -= 1
+            if mtime_ns is None or (folder != base_folder and matcher.is_excluded_dir(folder)):
+                continue
+            relisted += 1
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            # A folder that appeared while the organizer was stopped is cataloged in full
+                            if entry.path not in known_folders and not matcher.is_excluded_dir(entry.path):
+                                added += self._scan_tree(entry.path, matcher, categories, temp_suffixes, known_folders)
+                        elif entry.is_file(follow_symlinks=False) and not matcher.is_excluded(entry.path):
+                            self._add_entry(entry, categories, temp_suffixes)
+                            added += 1
+            except OSError as e:
+                logging.warning("Error scanning %s: %s", folder, e)
+        logging.info("Refreshed catalog under %s: relisted %d of %d folders, %d files", base_folder, relisted, len(known), added)
+        return added
+
+    def save(self, path, signature):
+        """Write the catalog and the current mtime of every known folder to a file.
+
+        signature identifies the configuration the catalog was built with; load() rejects a file saved under another one.
+        """
+        with self.lock:
+            dirs = list(self.dirs)
+            header = {
+                "version": self.VERSION,
+                "signature": signature,
+                "rows": len(self.size),
+                "live": self.live,
+                "dirs": dirs,
+                "categories": list(self.category_table),
+            }
+            columns = [getattr(self, name).tobytes() for name in self.SAVED_COLUMNS]
+            names = bytes(self.names)
+        mtimes = []
+        for folder in dirs:
+            try:
+                mtimes.append(os.stat(folder).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        header["mtimes"] = mtimes
+        encoded = json.dumps(header).encode('utf-8')
+        try:
+            with open(path + '.tmp', 'wb') as f:
+                f.write(struct.pack('<4sI', self.MAGIC, len(encoded)))
+                f.write(encoded)
+                for column in columns:
+                    f.write(column)
+                f.write(names)
+            os.replace(path + '.tmp', path)
+            logging.info("Saved catalog of %d files to %s", header["live"], path)
+        except OSError as e:
+            logging.error("Error saving catalog %s: %s", path, e)
+
+    def load(self, path, signature):
+        """Replace the catalog with a saved one; returns False if the file is missing, corrupt or for another configuration."""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, header_length = struct.unpack_from('<4sI', data, 0)
+            header = json.loads(data[8:8 + header_length])
+            if magic != self.MAGIC or header.get("version") != self.VERSION or header.get("signature") != signature:
+                return False
+            offset = 8 + header_length
+            rows = header["rows"]
+            with self.lock:
+                self._reset()
+                for name in self.SAVED_COLUMNS:
+                    column = getattr(self, name)
+                    length = rows * column.itemsize
+                    column.frombytes(data[offset:offset + length])
+                    offset += length
+                self.names = bytearray(data[offset:])
+                self.dirs = header["dirs"]
+                self.dir_ids = {folder: dir_id for dir_id, folder in enumerate(self.dirs)}
+                self.category_table = header["categories"]
+                self.category_ids = {category: category_id for category_id, category in enumerate(self.category_table)}
+                self.saved_mtimes = {dir_id: mtime for dir_id, mtime in enumerate(header["mtimes"]) if mtime is not None}
+                for row in range(rows):
+                    self.path_hash.append(self._hash(self._path(row)))
+                    if self.category[row] != self.DELETED:
+                        self.dir_rows.setdefault(self.dir_id[row], array('I')).append(row)
+                self.live = header["live"]
+                self._grow_slots()
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.error("Ignoring unusable catalog %s: %s", path, e)
+            with self.lock:
+                self._reset()
+            return False
+        logging.info("Loaded catalog of %d files from %s", self.live, path)
+        return True
+
+    @staticmethod
+    def category_of(file_name, categories, temp_suffixes=TEMP_SUFFIXES):
+        """Return the category a file is cataloged under; temporary files get an empty category."""
+        ext = os.path.splitext(file_name)[1].lower()
+        return '' if ext in temp_suffixes else categories.get(ext, 'Others')
+
+    def _matching_rows(self, category=None, min_size=None, max_size=None, older_than=None, newer_than=None):
+        """Return a list of row numbers of live files matching every given filter."""
+        now = time.time()
+        category_id = self.category_ids.get(category, -1) if category is not None else None
+        if numpy is not None and len(self.size):
+            categories_column = numpy.frombuffer(self.category, dtype=numpy.uint16)
+            mask = categories_column != self.DELETED
+            if category_id is not None:
+                mask &= categories_column == category_id
+            if min_size is not None or max_size is not None:
+                sizes = numpy.frombuffer(self.size, dtype=numpy.uint64)
+                if min_size is not None:
+                    mask &= sizes >= min_size
+                if max_size is not None:
+                    mask &= sizes <= max_size
+            if older_than is not None or newer_than is not None:
+                mtimes = numpy.frombuffer(self.mtime, dtype=numpy.uint32)
+                if older_than is not None:
+                    mask &= mtimes < now - older_than
+                if newer_than is not None:
+                    mask &= mtimes >= now - newer_than
+            return numpy.flatnonzero(mask).tolist()
+        rows = []
+        for row, (row_category, size, mtime) in enumerate(zip(self.category, self.size, self.mtime)):
+            if row_category == self.DELETED or (category_id is not None and row_category != category_id):
+                continue
+            if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
+                continue
+            if (older_than is not None and mtime >= now - older_than) or (newer_than is not None and mtime < now - newer_than):
+                continue
+            rows.append(row)
+        return rows
+
+    def query(self, category=None, min_size=None, max_size=None, older_than=None, newer_than=None, limit=None):
+        """Return paths of cataloged files by category, size range in bytes and age in seconds."""
+        with self.lock:
+            rows = self._matching_rows(category, min_size, max_size, older_than, newer_than)
+            return [self._path(row) for row in rows[:limit]]
+
+    def totals(self):
+        """Return {category: (files, bytes)} for all cataloged files."""
+        with self.lock:
+            if numpy is not None and len(self.size):
+                categories_column = numpy.frombuffer(self.category, dtype=numpy.uint16)
+                live = categories_column != self.DELETED
+                ids = categories_column[live]
+                counts = numpy.bincount(ids, minlength=len(self.category_table))
+                sizes = numpy.bincount(ids, weights=numpy.frombuffer(self.size, dtype=numpy.uint64)[live], minlength=len(self.category_table))
+                return {name: (int(counts[i]), int(sizes[i])) for i, name in enumerate(self.category_table) if counts[i]}
+            result = {}
+            for category_id, size in zip(self.category, self.size):
+                if category_id == self.DELETED:
+                    continue
+                count, total = result.get(category_id, (0, 0))
+                result[category_id] = (count + 1, total + size)
+            return {self.category_table[i]: value for i, value in result.items()}
+
+    def __len__(self):
+        return self.live
+
+    def bytes_per_file(self):
+        """Approximate memory used per live file by the columns, name buffer and hash table."""
+        if not self.live:
+            return 0.0
+        columns = (self.name_offset, self.name_length, self.dir_id, self.size, self.mtime, self.inode,
+                   self.category, self.path_hash, self.slots)
+        total = sum(column.itemsize * len(column) for column in columns) + len(self.names)
+        total += sum(rows.itemsize * len(rows) for rows in self.dir_rows.values())
+        return total / self.live
+
+class WatcherState:
+    """Per-folder directory snapshots saved while watching and at shutdown, memory-mapped at startup to catch up on missed files.
+
+    Each monitored folder records its identity and ownership, last event time and, for every non-category folder below it,
+    the folder mtime plus CRC32 hashes of the file names that were deliberately left in place. At startup only
+    folders whose mtime changed are listed again.
+    """
+    MAGIC = b'FOWS'
+    VERSION = 2
+    # Stored instead of the real mtime when a folder still held unorganized files, forcing a relist
+    FORCE_RELIST = -1
+    # Seconds between saves while watching, so a crash loses at most this much catch-up information
+    SAVE_INTERVAL = 300
+
+    def __init__(self, state_file='watcher_state.bin'):
+        self.state_file = state_file
+        self.mapping = None
+        self.folders = {}
+
+    @staticmethod
+    def capture(handler):
+        """Snapshot the folders a handler watches, skipping category folders and excluded subtrees."""
+        base_folder = handler.base_folder
+        config = handler.config
+        stat = os.stat(base_folder)
+        dirs = []
+        stack = [base_folder]
+        while stack:
+            folder = stack.pop()
+            try:
+                folder_mtime = os.stat(folder).st_mtime_ns
+                skipped = []
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if (handler.recursive and not (folder == base_folder and entry.name in config.category_names)
+                                    and not handler.exclusion_matcher.is_excluded_dir(entry.path)):
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            ext = os.path.splitext(entry.name)[1].lower()
+                            if ext in config.temp_suffixes or is_bundle_file(entry.name) or handler.exclusion_matcher.is_excluded(entry.path):
+                                skipped.append(zlib.crc32(os.fsencode(entry.name)))
+                            else:
+                                folder_mtime = WatcherState.FORCE_RELIST
+            except OSError as e:
+                logging.warning("Error capturing watcher state for %s: %s", folder, e)
+                continue
+            dirs.append((os.path.relpath(folder, base_folder), folder_mtime, skipped))
+        return (base_folder, stat.st_dev, stat.st_ino, stat.st_mode, stat.st_uid, stat.st_gid,
+                handler.last_event_time, handler.recursive, dirs)
+
+    def save(self, records):
+        """Write the captured folder records to the state file."""
+        chunks = [struct.pack('<4sHI', self.MAGIC, self.VERSION, len(records))]
+        for base_folder, dev, ino, mode, uid, gid, last_event_time, recursive, dirs in records:
+            path = os.fsencode(base_folder)
+            chunks.append(struct.pack('<H', len(path)) + path)
+            chunks.append(struct.pack('<QQIIIdBI', dev, ino, mode, uid, gid, last_event_time, recursive, len(dirs)))
+            for relative, mtime_ns, hashes in dirs:
+                encoded = os.fsencode(relative)
+                chunks.append(struct.pack('<H', len(encoded)) + encoded)
+                chunks.append(struct.pack(f'<qI{len(hashes)}I', mtime_ns, len(hashes), *hashes))
+        try:
+            with open(self.state_file + '.tmp', 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(self.state_file + '.tmp', self.state_file)
+            logging.info("Saved watcher state for %d folders to %s", len(records), self.state_file)
+        except OSError as e:
+            logging.error("Error saving watcher state %s: %s", self.state_file, e)
+
+    def load(self):
+        """Memory-map the state file and index its folder records; returns False if there is no usable state."""
+        self.close()
+        try:
+            with open(self.state_file, 'rb') as f:
+                self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        try:
+            magic, version, count = struct.unpack_from('<4sHI', self.mapping, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                self.close()
+                return False
+            offset = 10
+            for _ in range(count):
+                (path_length,) = struct.unpack_from('<H', self.mapping, offset)
+                base_folder = os.fsdecode(self.mapping[offset + 2:offset + 2 + path_length])
+                offset += 2 + path_length
+                dev, ino, mode, uid, gid, last_event_time, recursive, dir_count = struct.unpack_from('<QQIIIdBI', self.mapping, offset)
+                offset += struct.calcsize('<QQIIIdBI')
+                dirs = []
+                for _ in range(dir_count):
+                    (relative_length,) = struct.unpack_from('<H', self.mapping, offset)
+                    relative = os.fsdecode(self.mapping[offset + 2:offset + 2 + relative_length])
+                    offset += 2 + relative_length
+                    mtime_ns, hash_count = struct.unpack_from('<qI', self.mapping, offset)
+                    # Name hashes stay in the mapping and are only read for folders that changed
+                    dirs.append((relative, mtime_ns, offset + 12, hash_count))
+                    offset += 12 + 4 * hash_count
+                self.folders[normalize_folder_key(base_folder)] = (dev, ino, mode, uid, gid, last_event_time, bool(recursive), dirs)
+        except (struct.error, ValueError) as e:
+            logging.error("Ignoring corrupt watcher state %s: %s", self.state_file, e)
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self.folders = {}
+
+    def folder(self, base_folder):
+        """Return (dev, ino, mode, uid, gid, last_event_time, recursive, dirs) for a folder, or None if it was not saved."""
+        return self.folders.get(normalize_folder_key(base_folder))
+
+    def is_unchanged_folder(self, base_folder, stat):
+        """Return True if a monitored folder is the same directory, with the same permissions and owner, as last time."""
+        record = self.folder(base_folder)
+        return record is not None and record[:5] == (stat.st_dev, stat.st_ino, stat.st_mode, stat.st_uid, stat.st_gid)
+
+    def missed_files(self, handler):
+        """Return files that appeared in a handler's folders since the state was saved."""
+        record = self.folder(handler.base_folder)
+        if record is None or record[6] != handler.recursive:
+            return []
+        known_dirs = {relative for relative, _, _, _ in record[7]}
+        category_names = handler.config.category_names
+        missed = []
+        new_dirs = []
+        for relative, mtime_ns, hash_offset, hash_count in record[7]:
+            folder = os.path.normpath(os.path.join(handler.base_folder, relative))
+            try:
+                if os.stat(folder).st_mtime_ns == mtime_ns:
+                    continue
+                skipped = set(struct.unpack_from(f'<{hash_count}I', self.mapping, hash_offset))
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file(follow_symlinks=False):
+                            if zlib.crc32(os.fsencode(entry.name)) not in skipped and not handler.exclusion_matcher.is_excluded(entry.path):
+                                missed.append(entry.path)
+                        elif (handler.recursive and entry.is_dir(follow_symlinks=False)
+                                and os.path.relpath(entry.path, handler.base_folder) not in known_dirs
+                                and not (relative == '.' and entry.name in category_names)
+                                and not handler.exclusion_matcher.is_excluded_dir(entry.path)):
+                            new_dirs.append(entry.path)
+            except OSError:
+                continue
+        for folder in new_dirs:
+            missed.extend(entry.path for entry in handler.exclusion_matcher.walk(folder))
+        return missed
+
+# Organize lanes from most to least urgent
+LANES = ('interactive', 'normal', 'bulk')
+# Seconds a large cross-device move waits while more urgent files are queued
+DEFER_DELAY = 2.0
+MAX_DEFERRALS = 5
+
+def choose_lane(size, category, folder_priority, scheduling):
+    """Pick the lane for a file from its size, its category and the priority of its monitored folder."""
+    if size >= scheduling.get("large_file_size", 1024 ** 3):
+        return 'bulk'
+    lane = 0 if size <= scheduling.get("small_file_size", 16 * 1024 ** 2) else 1
+    if category in scheduling.get("bulk_categories", ()):
+        lane = max(lane, 1)
+    if folder_priority == "high":
+        lane = max(lane - 1, 0)
+    elif folder_priority == "low":
+        lane = min(lane + 1, 2)
+    return LANES[lane]
+
+class OrganizeQueue:
+    """Worker pool shared by all handlers that schedules queued work across priority lanes.
+
+    Lanes are served by weighted round robin, and bulk work never occupies the last free worker,
+    so small files keep moving while a bulk backlog drains.
+    """
+    def __init__(self, workers=HANDLER_WORKERS, weights=None):
+        self.weights = {lane: max(1, int((weights or {}).get(lane, default))) for lane, default in zip(LANES, (8, 3, 1))}
+        self.condition = threading.Condition()
+        self.lanes = {lane: deque() for lane in LANES}
+        self.credits = dict(self.weights)
+        self.running = dict.fromkeys(LANES, 0)
+        self.waits = {lane: deque(maxlen=1024) for lane in LANES}
+        self.completed = dict.fromkeys(LANES, 0)
+        self.is_running = True
+        self.threads = []
+        self.target_workers = 0
+        # Files still being written wait here, outside the lanes, until they are complete
+        self.readiness = ReadinessStage()
+        self.set_workers(workers)
+
+    def set_workers(self, workers):
+        """Grow or shrink the pool; surplus workers exit after their current item."""
+        with self.condition:
+            self.target_workers = max(1, workers)
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.target_workers:
+                thread = threading.Thread(target=self._work, name=f"organizer-{len(self.threads) + 1}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+            self.condition.notify_all()
+
+    def submit(self, lane, fn, *args):
+        """Queue a call in a lane."""
+        with self.condition:
+            if not self.is_running:
+                return
+            self.lanes[lane].append((time.monotonic(), fn, args))
+            self.condition.notify()
+
+    def defer(self, lane, delay, fn, *args):
+        """Queue a call in a lane after a delay."""
+        timer = threading.Timer(delay, self.submit, (lane, fn) + args)
+        timer.daemon = True
+        timer.start()
+
+    def has_urgent_work(self):
+        """Return whether interactive or normal work is waiting."""
+        return bool(self.lanes['interactive'] or self.lanes['normal'])
+
+    def _next(self):
+        """Take the next item by weighted round robin, or None if nothing may run now."""
+        bulk_open = self.running['bulk'] < max(1, self.target_workers - 1)
+        ready = [lane for lane in LANES if self.lanes[lane] and (lane != 'bulk' or bulk_open)]
+        if not ready:
+            return None
+        if not any(self.credits[lane] for lane in ready):
+            self.credits = dict(self.weights)
+        lane = next(lane for lane in ready if self.credits[lane])
+        self.credits[lane] -= 1
+        return lane, self.lanes[lane].popleft()
+
+    def _work(self):
+        """Run queued calls until the queue shuts down or the pool shrinks."""
+        me = threading.current_thread()
+        while True:
+            with self.condition:
+                while True:
+                    if not self.is_running or (len(self.threads) > self.target_workers and me in self.threads):
+                        if me in self.threads:
+                            self.threads.remove(me)
+                        return
+                    item = self._next()
+                    if item:
+                        break
+                    self.condition.wait()
+                lane, (queued_at, fn, args) = item
+                self.running[lane] += 1
+                self.waits[lane].append(time.monotonic() - queued_at)
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error("Error in %s organize lane: %s", lane, e)
+            finally:
+                with self.condition:
+                    self.running[lane] -= 1
+                    self.completed[lane] += 1
+                    self.condition.notify_all()
+
+    def metrics(self):
+        """Return per-lane queued, running and completed counts with the p95 queue wait in seconds."""
+        with self.condition:
+            result = {}
+            for lane in LANES:
+                waits = sorted(self.waits[lane])
+                result[lane] = {
+                    "queued": len(self.lanes[lane]),
+                    "running": self.running[lane],
+                    "completed": self.completed[lane],
+                    "p95_wait": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                }
+            result["workers"] = self.target_workers
+            result["waiting_ready"] = len(self.readiness)
+            return result
+
+    def format_metrics(self):
+        """Return the lane metrics as a short line of text."""
+        metrics = self.metrics()
+        lanes = ", ".join(f"{lane} {metrics[lane]['queued']} queued/{metrics[lane]['running']} running "
+                          f"(p95 wait {metrics[lane]['p95_wait'] * 1000:.0f} ms)" for lane in LANES)
+        return f"Queue ({metrics['workers']} workers, {metrics['waiting_ready']} files being written): {lanes}"
+
+    def shutdown(self):
+        """Stop the workers and drop queued work."""
+        self.readiness.shutdown()
+        with self.condition:
+            self.is_running = False
+            for lane in LANES:
+                self.lanes[lane].clear()
+            self.condition.notify_all()
+
+class IoThrottle:
+    """Token bucket limiting the bytes per second written by copies and bundling; a rate of 0 means unlimited."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.allowance = 0.0
+        self.last = time.monotonic()
+
+    def set_rate(self, rate):
+        """Change the limit in bytes per second."""
+        with self.lock:
+            self.rate = rate
+            self.allowance = float(rate)
+            self.last = time.monotonic()
+
+    def consume(self, size):
+        """Account for size bytes, sleeping long enough to stay under the rate."""
+        if not self.rate:
+            return
+        with self.lock:
+            rate = self.rate
+            if not rate:
+                return
+            now = time.monotonic()
+            self.allowance = min(float(rate), self.allowance + (now - self.last) * rate) - size
+            self.last = now
+            deficit = -self.allowance
+        if deficit > 0:
+            time.sleep(deficit / rate)
+
+IO_THROTTLE = IoThrottle()
+
+class _FILETIME(ctypes.Structure):
+    _fields_ = [("low", ctypes.c_uint32), ("high", ctypes.c_uint32)]
+
+class _MEMORYSTATUSEX(ctypes.Structure):
+    _fields_ = [("length", ctypes.c_uint32), ("memory_load", ctypes.c_uint32)] + [(name, ctypes.c_uint64) for name in (
+        "total_phys", "avail_phys", "total_page_file", "avail_page_file", "total_virtual", "avail_virtual", "avail_extended_virtual")]
+
+class _SYSTEM_POWER_STATUS(ctypes.Structure):
+    _fields_ = [("ac_line_status", ctypes.c_uint8), ("battery_flag", ctypes.c_uint8), ("battery_life_percent", ctypes.c_uint8),
+                ("system_status_flag", ctypes.c_uint8), ("battery_life_time", ctypes.c_uint32), ("battery_full_life_time", ctypes.c_uint32)]
+
+class _LASTINPUTINFO(ctypes.Structure):
+    _fields_ = [("size", ctypes.c_uint32), ("time", ctypes.c_uint32)]
+
+class LoadMonitor:
+    """Sample CPU, disk queue, memory, battery and user idle time, and throttle the organizer to match.
+
+    At full speed the queue runs all its workers with unlimited I/O; while the machine is busy or on
+    battery it drops to a few workers and a capped I/O rate, and heavy background stages (archive
+    bundling, statistics reconciles) wait for a quiet period. Each change of mode is kept with its
+    reason for the metrics.
+    """
+    MODES = ('full', 'reduced', 'throttled')
+
+    def __init__(self):
+        self.settings = {}
+        self.queue = None
+        self.base_workers = HANDLER_WORKERS
+        self.mode = 'full'
+        self.reason = "not monitoring"
+        self.sample = {}
+        self.decisions = deque(maxlen=50)
+        self._previous_cpu = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, queue, settings):
+        """Start sampling and adjusting the given OrganizeQueue."""
+        if not settings.get("enabled", True):
+            return
+        self.settings = settings
+        self.queue = queue
+        self.base_workers = queue.target_workers
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="load-monitor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and lift any throttling."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self._apply('full', "not monitoring")
+        self.queue = None
+
+    def is_quiet(self):
+        """Return whether heavy background work may run now."""
+        return self.mode == 'full'
+
+    def _run(self):
+        while not self.stop_event.wait(self.settings.get("interval", 5)):
+            try:
+                self.sample = self.take_sample()
+                self._apply(*self.decide(self.sample))
+            except Exception as e:
+                logging.error("Error sampling system load: %s", e)
+
+    def take_sample(self):
+        """Return the current load readings; readings a platform cannot provide are None."""
+        return {
+            "cpu": self._cpu_busy(),
+            "disk_queue": self._disk_queue(),
+            "memory": self._memory_used(),
+            "on_battery": self._on_battery(),
+            "idle_seconds": self._idle_seconds(),
+        }
+
+    def decide(self, sample):
+        """Return (mode, reason) for a sample."""
+        settings = self.settings
+        busy = []
+        if sample["cpu"] is not None and sample["cpu"] >= settings.get("busy_cpu", 0.75):
+            busy.append(f"CPU {sample['cpu']:.0%}")
+        if sample["disk_queue"] is not None and sample["disk_queue"] >= settings.get("busy_disk_queue", 8):
+            busy.append(f"disk queue {sample['disk_queue']}")
+        if sample["memory"] is not None and sample["memory"] >= settings.get("memory_limit", 0.9):
+            busy.append(f"memory {sample['memory']:.0%}")
+        if sample["on_battery"] and settings.get("throttle_on_battery", True):
+            busy.append("on battery")
+        if busy:
+            return 'throttled', ", ".join(busy)
+        idle = sample["idle_seconds"]
+        if idle is not None and idle < settings.get("idle_seconds", 120):
+            return 'reduced', f"user active {idle:.0f}s ago"
+        return 'full', "idle" if idle is not None else "load is low"
+
+    def _apply(self, mode, reason):
+        """Switch worker count and I/O rate when the mode changes."""
+        self.reason = reason
+        if mode == self.mode:
+            return
+        rate = self.settings.get("throttled_io_rate", 16 * 1024 * 1024)
+        workers = {'full': self.base_workers, 'reduced': max(2, self.base_workers // 2), 'throttled': max(2, self.base_workers // 4)}[mode]
+        if self.queue:
+            self.queue.set_workers(workers)
+        IO_THROTTLE.set_rate({'full': 0, 'reduced': rate * 4, 'throttled': rate}[mode])
+        logging.info("Switched to %s mode (%s): %d workers", mode, reason, workers)
+        self.decisions.append({"time": time.time(), "mode": mode, "reason": reason, "workers": workers})
+        EVENTS.publish("throttle", mode=mode, reason=reason, workers=workers)
+        self.mode = mode
+
+    def metrics(self):
+        """Return the current mode, its reason, the last sample and recent decisions."""
+        return {
+            "mode": self.mode,
+            "reason": self.reason,
+            "workers": self.queue.target_workers if self.queue else None,
+            "io_rate": IO_THROTTLE.rate,
+            "sample": dict(self.sample),
+            "decisions": list(self.decisions),
+        }
+
+    def _cpu_busy(self):
+        """Return the busy fraction of all CPUs since the previous sample."""
+        times = None
+        if os.path.exists('/proc/stat'):
+            with open('/proc/stat') as f:
+                fields = [int(value) for value in f.readline().split()[1:9]]
+            times = (fields[3] + fields[4], sum(fields))
+        elif sys.platform == 'win32':
+            idle, kernel, user = _FILETIME(), _FILETIME(), _FILETIME()
+            if ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+                value = lambda t: (t.high << 32) | t.low
+                # Kernel time includes idle time
+                times = (value(idle), value(kernel) + value(user))
+        if times is None:
+            return None
+        previous, self._previous_cpu = self._previous_cpu, times
+        if previous is None or times[1] == previous[1]:
+            return None
+        return 1.0 - (times[0] - previous[0]) / (times[1] - previous[1])
+
+    @staticmethod
+    def _disk_queue():
+        """Return the number of I/Os in flight on whole disks (Linux only)."""
+        if not os.path.exists('/proc/diskstats'):
+            return None
+        in_flight = 0
+        with open('/proc/diskstats') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 11 and os.path.exists(f'/sys/block/{fields[2]}') and not fields[2].startswith(('loop', 'ram')):
+                    in_flight += int(fields[11])
+        return in_flight
+
+    @staticmethod
+    def _memory_used():
+        """Return the fraction of physical memory in use."""
+        if os.path.exists('/proc/meminfo'):
+            values = {}
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    name, _, rest = line.partition(':')
+                    values[name] = int(rest.split()[0])
+            if values.get("MemTotal") and "MemAvailable" in values:
+                return 1.0 - values["MemAvailable"] / values["MemTotal"]
+        elif sys.platform == 'win32':
+            status = _MEMORYSTATUSEX()
+            status.length = ctypes.sizeof(status)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.memory_load / 100
+        return None
+
+    @staticmethod
+    def _on_battery():
+        """Return whether the machine runs on battery, or None if unknown."""
+        if sys.platform == 'win32':
+            status = _SYSTEM_POWER_STATUS()
+            if ctypes.windll.kernel32.GetSystemPowerStatus(ctypes.byref(status)):
+                return status.ac_line_status == 0
+            return None
+        supplies = '/sys/class/power_supply'
+        if not os.path.isdir(supplies):
+            return None
+        for name in os.listdir(supplies):
+            try:
+                with open(os.path.join(supplies, name, 'type')) as f:
+                    if f.read().strip() != 'Battery':
+                        continue
+                with open(os.path.join(supplies, name, 'status')) as f:
+                    return f.read().strip() == 'Discharging'
+            except OSError:
+                continue
+        return False
+
+    @staticmethod
+    def _idle_seconds():
+        """Return seconds since the last keyboard or mouse input, or None if unknown.
+
+        Elsewhere than Windows this is logind's idle hint, which the desktop only raises after its own idle
+        delay (often several minutes), so until then the user counts as active.
+        """
+        if sys.platform != 'win32':
+            return LoadMonitor._logind_idle_seconds()
+        info = _LASTINPUTINFO()
+        info.size = ctypes.sizeof(info)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        return ((ctypes.windll.kernel32.GetTickCount() - info.time) & 0xFFFFFFFF) / 1000
+
+    @staticmethod
+    def _logind_idle_seconds():
+        """Return seconds since logind marked this session idle, 0 while it is active, or None without logind."""
+        if not shutil.which('loginctl'):
+            return None
+        try:
+            result = subprocess.run(['loginctl', 'show-session', os.environ.get('XDG_SESSION_ID', 'auto'),
+                                     '-p', 'IdleHint', '-p', 'IdleSinceHint'], capture_output=True, text=True, timeout=2)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        values = dict(line.split('=', 1) for line in result.stdout.splitlines() if '=' in line)
+        since = int(values.get('IdleSinceHint') or 0)
+        if result.returncode != 0 or not since:
+            return None  # No session, or a desktop that never reports idleness
+        if values.get('IdleHint') != 'yes':
+            return 0.0
+        return max(0.0, time.time() - since / 1e6)
+
+LOAD = LoadMonitor()
+
+class EventSubscription:
+    """Bounded queue of events for one subscriber; when it is full the oldest events are dropped and counted."""
+    def __init__(self, bus, max_events):
+        self.bus = bus
+        self.events = deque(maxlen=max_events)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, event):
+        """Queue an event without ever blocking the publisher."""
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def take(self, timeout):
+        """Wait up to timeout for events and return (events, dropped since the last call)."""
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        """Stop receiving events."""
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """Fan out organizer events to subscribers such as the control API's event stream."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = ()
+        self.published = 0
+
+    def subscribe(self, max_events=10000):
+        """Return a new EventSubscription."""
+        subscription = EventSubscription(self, max_events)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription."""
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscription)
 
-def get_category(file_name, categories):
-    """Return the category folder for a given file based on its extension."""
-    _, ext = os.path.splitext(file_name)
-    ext = ext.lower()
-    
-    if ext in ('.tmp', '.download', '.crdownload', '.onetoc2', '.onecache'):
-        logging.info("Skipped temporary/OneDrive file: %s", file_name)
-        return None
-    
-    return categories.get(ext, 'Others')
+    def publish(self, event_type, **fields):
+        """Send an event to every subscriber; costs one lock and one check when nobody is subscribed."""
+        with self.lock:
+            self.published += 1
+        subscribers = self.subscribers
+        if not subscribers:
+            return
+        fields["type"] = event_type
+        fields["time"] = time.time()
+        for subscription in subscribers:
+            subscription.put(fields)
 
-def is_already_organized(file_path, base_folder, categories):
-    """Check if a file is already in its correct category folder."""
-    file_name = os.path.basename(file_path)
-    expected_category = get_category(file_name, categories)
-    if not expected_category:
+EVENTS = EventBus()
+
+# Event types stored in traces; the position in this tuple is the code written to the file
+TRACE_EVENT_TYPES = ('created', 'deleted', 'modified', 'moved', 'closed', 'closed_no_write', 'opened')
+TRACE_MAGIC = b'FOTRACE1'
+# Record kinds: a new monitored folder, a new relative path, an event, or the end of the current path table
+TRACE_FOLDER, TRACE_PATH, TRACE_EVENT, TRACE_RESET = 0, 1, 2, 3
+# Interned paths kept before the table starts over, bounding a long capture's memory
+TRACE_MAX_PATHS = 65536
+# The compressed stream is flushed to disk after this many events or seconds, so a crash loses little
+TRACE_FLUSH_EVENTS = 256
+TRACE_FLUSH_INTERVAL = 1.0
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+class EventTraceRecorder:
+    """Record the raw observer events of every handler to a compact binary trace for later replay.
+
+    Paths are stored relative to their monitored folder with '/' separators, so a trace replays on any
+    platform, and interned, so each event costs a few varint bytes (type, folder, microseconds since
+    the previous event, file size, path ids) before the whole stream is zlib-compressed.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.file = None
+        self.path = None
+        self.compressor = None
+        self.folder_ids = {}
+        self.path_ids = {}
+        self.last_time = 0.0
+        self.events = 0
+        self.unflushed = 0
+        self.flush_timer = None
+
+    def start(self, path):
+        """Start recording to path, replacing any existing file."""
+        with self.lock:
+            if self.enabled:
+                return False
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self.file = open(path, 'wb')
+            self.file.write(TRACE_MAGIC)
+            self.path = path
+            self.compressor = zlib.compressobj(6)
+            self.folder_ids = {}
+            self.path_ids = {}
+            self.last_time = time.monotonic()
+            self.events = 0
+            self.unflushed = 0
+            self.enabled = True
+        logging.info("Recording event trace to %s", path)
         return True
-    
-    current_folder = os.path.normpath(os.path.normcase(os.path.dirname(file_path)))
-    expected_folder = os.path.normpath(os.path.normcase(os.path.join(base_folder, expected_category)))
-    base_folder_normalized = os.path.normpath(os.path.normcase(base_folder))
-    
-    is_correct = current_folder.startswith(expected_folder) and current_folder != base_folder_normalized
-    if is_correct:
-        logging.info("Skipped %s: already in correct folder %s", file_name, expected_category)
-    else:
-        logging.info("Processing %s: current=%s, expected=%s, root=%s", file_name, current_folder, expected_folder, base_folder_normalized)
-    return is_correct
 
-def organize_file(file_path, base_folder, categories, organize_by_date=False):
-    """Move a file to its category folder, optionally by date, creating folders if needed."""
-    try:
-        file_name = os.path.basename(file_path)
-        
-        if is_already_organized(file_path, base_folder, categories):
-            return False, f"Skipped {file_name}: already in correct folder {get_category(file_name, categories)}"
-        
-        category = get_category(file_name, categories)
-        if not category:
-            return False, f"Skipped {file_name}: temporary or unsupported file type"
-        
-        target_folder = os.path.join(base_folder, category)
-        if organize_by_date:
+    def stop(self):
+        """Finish the trace and return its path, or None if nothing was recording."""
+        with self.lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+            if self.flush_timer:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            self.file.write(self.compressor.flush())
+            self.file.close()
+            self.file = None
+        logging.info("Recorded %d events to %s", self.events, self.path)
+        return self.path
+
+    def _intern(self, table, kind, key, out):
+        ident = table.get(key)
+        if ident is None:
+            ident = table[key] = len(table)
+            encoded = key.encode('utf-8', 'surrogateescape')
+            out.append(kind)
+            _write_varint(out, len(encoded))
+            out.extend(encoded)
+        return ident
+
+    @staticmethod
+    def _relative(path, base_folder):
+        return os.path.relpath(path, base_folder).replace(os.sep, '/')
+
+    def record(self, base_folder, event):
+        """Append one observer event seen by the handler of base_folder."""
+        if event.event_type not in TRACE_EVENT_TYPES:
+            return
+        moved = event.event_type == 'moved'
+        size = 0
+        if not event.is_directory and event.event_type != 'deleted':
             try:
-                timestamp = os.path.getctime(file_path)
-                date_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-                target_folder = os.path.join(target_folder, date_str)
-            except Exception as e:
-                logging.error("Error getting timestamp for %s: %s", file_name, e)
-                target_folder = os.path.join(base_folder, category)
-        
-        if not os.access(os.path.dirname(file_path), os.W_OK) or not os.access(base_folder, os.W_OK):
-            raise PermissionError("No write access to source or destination folder")
-        
-        os.makedirs(target_folder, exist_ok=True)
-        
-        target_path = os.path.join(target_folder, file_name)
-        base_name, ext = os.path.splitext(file_name)
-        counter = 1
-        while os.path.exists(target_path):
-            new_file_name = f"{base_name}_{counter}{ext}"
-            target_path = os.path.join(target_folder, new_file_name)
-            counter += 1
-        
-        shutil.move(file_path, target_path)
-        logging.info("Moved %s to %s", file_name, target_path)
-        return True, f"Moved {file_name} to {category}{'/' + date_str if organize_by_date else ''}"
-    except PermissionError as e:
-        logging.error("Permission error moving %s: %s", file_name, e)
-        return False, f"Permission error moving {file_name}: {str(e)}. Try running as administrator."
-    except FileNotFoundError as e:
-        logging.error("File not found for %s: %s", file_name, e)
-        return False, f"File not found for {file_name}: {str(e)}"
-    except Exception as e:
-        logging.error("Error moving %s: %s", file_name, e)
-        return False, f"Error moving {file_name}: {str(e)}"
+                size = os.stat(event.dest_path if moved else event.src_path).st_size + 1
+            except OSError:
+                pass
+        with self.lock:
+            if not self.enabled:
+                return
+            out = bytearray()
+            if len(self.path_ids) + 2 > TRACE_MAX_PATHS:
+                self.path_ids = {}
+                out.append(TRACE_RESET)
+            folder_id = self._intern(self.folder_ids, TRACE_FOLDER, base_folder, out)
+            src_id = self._intern(self.path_ids, TRACE_PATH, self._relative(event.src_path, base_folder), out)
+            dest_id = self._intern(self.path_ids, TRACE_PATH, self._relative(event.dest_path, base_folder), out) if moved else 0
+            now = time.monotonic()
+            out.append(TRACE_EVENT)
+            _write_varint(out, TRACE_EVENT_TYPES.index(event.event_type) << 1 | bool(event.is_directory))
+            _write_varint(out, folder_id)
+            _write_varint(out, int((now - self.last_time) * 1000000))
+            _write_varint(out, size)
+            _write_varint(out, src_id)
+            if moved:
+                _write_varint(out, dest_id)
+            self.last_time = now
+            self.events += 1
+            self.file.write(self.compressor.compress(bytes(out)))
+            self.unflushed += 1
+            if self.unflushed >= TRACE_FLUSH_EVENTS:
+                self._flush()
+            elif self.flush_timer is None:
+                # Events that arrive in a trickle still reach the disk within TRACE_FLUSH_INTERVAL
+                self.flush_timer = threading.Timer(TRACE_FLUSH_INTERVAL, self._flush_later)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def _flush(self):
+        """Write out everything compressed so far as complete deflate blocks; call with the lock held."""
+        if self.flush_timer:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.file.flush()
+        self.unflushed = 0
+
+    def _flush_later(self):
+        with self.lock:
+            if self.flush_timer is threading.current_thread():
+                self.flush_timer = None
+            if self.enabled and self.unflushed:
+                self._flush()
+
+def read_trace(path):
+    """Return (folders, events) from a trace; each event is (seconds since start, type, is_directory,
+    folder index, size or None, relative path, relative destination or None), with '/' in relative paths."""
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not an event trace")
+        # A trace cut short by a crash still decompresses up to its last complete block
+        data = zlib.decompressobj().decompress(f.read())
+    folders = []
+    paths = []
+    events = []
+    clock = 0.0
+    pos = 0
+    try:
+        while pos < len(data):
+            kind = data[pos]
+            pos += 1
+            if kind == TRACE_RESET:
+                paths = []
+                continue
+            if kind in (TRACE_FOLDER, TRACE_PATH):
+                length, pos = _read_varint(data, pos)
+                (folders if kind == TRACE_FOLDER else paths).append(data[pos:pos + length].decode('utf-8', 'surrogateescape'))
+                pos += length
+                continue
+            code, pos = _read_varint(data, pos)
+            folder_id, pos = _read_varint(data, pos)
+            delta, pos = _read_varint(data, pos)
+            size, pos = _read_varint(data, pos)
+            src_id, pos = _read_varint(data, pos)
+            event_type = TRACE_EVENT_TYPES[code >> 1]
+            dest = None
+            if event_type == 'moved':
+                dest_id, pos = _read_varint(data, pos)
+                dest = paths[dest_id]
+            clock += delta / 1000000
+            events.append((clock, event_type, bool(code & 1), folder_id, size - 1 if size else None, paths[src_id], dest))
+    except IndexError:
+        logging.warning("Trace %s ends with an incomplete record", path)
+    return folders, events
+
+TRACE = EventTraceRecorder()
 
 class FileOrganizerHandler(FileSystemEventHandler):
     """Handle file system events to organize new or renamed files."""
-    def __init__(self, base_folder, categories, log_callback, recursive=False, exclusions=None, organize_by_date=False):
+    def __init__(self, base_folder, config, log_callback, archiver=None, stats=None, catalog=None, queue=None):
         self.base_folder = base_folder
-        self.categories = categories
+        self.config = config
         self.log_callback = log_callback
         self.is_running = True
         self.is_paused = False
-        self.recursive = recursive
-        self.exclusions = exclusions or []
-        self.organize_by_date = organize_by_date
-        self.recent_deletions = {}
-        logging.debug("Initialized handler for %s (recursive=%s, exclusions=%s, organize_by_date=%s)", base_folder, recursive, exclusions, organize_by_date)
+        settings = config.settings_for(base_folder)
+        self.recursive = settings["recursive"]
+        self.exclusions = settings["exclusions"]
+        self.priority = settings["priority"]
+        self.exclusion_matcher = ExclusionMatcher(base_folder, self.exclusions)
+        self.observer = None
+        self.archiver = archiver
+        self.stats = stats
+        self.catalog = catalog
+        self.last_event_time = 0.0
+        self.renames = RenameCorrelator()
+        self.readiness = WriteCompletionDetector()
+        self.dirs = DirectoryCache()
+        try:
+            self.base_device = os.stat(base_folder).st_dev
+        except OSError:
+            self.base_device = None
+        # Readiness waits happen off the observer thread so close events keep flowing while files are written
+        self.owns_queue = queue is None
+        self.queue = queue or OrganizeQueue(HANDLER_WORKERS, config.scheduling.get("weights"))
+        logging.debug("Initialized handler for %s (recursive=%s, exclusions=%s, config version=%d)", base_folder, self.recursive, self.exclusions, config.version)
+
+    def dispatch(self, event):
+        """Dispatch an observer event, recording it to the event trace and timing the callback when enabled."""
+        if TRACE.enabled:
+            TRACE.record(self.base_folder, event)
+        if not PROFILER.enabled:
+            return super().dispatch(event)
+        with PROFILER.span("on_" + event.event_type):
+            return super().dispatch(event)
 
     def on_any_event(self, event):
         """Log all file system events for debugging."""
+        self.last_event_time = time.time()
         logging.debug("Received event: type=%s, src_path=%s, is_directory=%s", event.event_type, event.src_path, event.is_directory)
 
     def on_deleted(self, event):
         """Track deleted files to detect potential renames."""
-        if not event.is_directory:
+        if event.is_directory:
+            self.dirs.invalidate(event.src_path)
+            if self.catalog is not None:
+                self.catalog.remove_tree(event.src_path)
+        else:
             file_path = event.src_path
             file_name = os.path.basename(file_path)
-            self.recent_deletions[file_path] = time.time()
+            known = self.catalog.remove(file_path) if self.catalog is not None else None
+            size = self.renames.note_deleted(file_path, known)
             logging.debug("Tracked deletion of %s for rename detection", file_name)
+            category = self._category_of(file_path)
+            if self.stats and category:
+                self.stats.record_remove(self.base_folder, category, os.path.splitext(file_name)[1].lower(), size, file_path)
+
+    def on_modified(self, event):
+        """Record writes so readiness checks know whether a later close event is current."""
+        if not event.is_directory:
+            self.readiness.note_modified(event.src_path)
+
+    def on_closed(self, event):
+        """Record that a writer closed a file (reported by inotify on Linux) and its final size."""
+        if not event.is_directory:
+            self.readiness.note_closed(event.src_path)
+            self._note_stat(event.src_path)
+
+    def _note_stat(self, file_path, stat=None):
+        """Record a file's size and inode in the catalog, or in the rename correlator when there is no catalog."""
+        try:
+            stat = stat or os.stat(file_path)
+        except OSError:
+            return None
+        if self.catalog is not None:
+            self.catalog.add(file_path, stat, FileCatalog.category_of(os.path.basename(file_path), self.config.categories, self.config.temp_suffixes))
+        else:
+            self.renames.note_seen(file_path, stat)
+        return stat
 
     def on_created(self, event):
-        """Handle file creation events and potential renames with retry mechanism."""
+        """Handle file creation events and potential renames, organizing them once they are fully written."""
+        if event.is_directory:
+            self._watch_new_folder(event.src_path)
+            if self.catalog is not None:
+                self.catalog.note_folder(event.src_path)
         if not self.is_running or self.is_paused or event.is_directory:
             self.log_callback(f"Skipped create event for {event.src_path}: {'stopped' if not self.is_running else 'paused' if self.is_paused else 'directory'}")
             return
         
         file_path = event.src_path
-        if any(os.path.normpath(file_path).startswith(os.path.normpath(excl)) for excl in self.exclusions):
-            self.log_callback(f"Skipped {os.path.basename(file_path)}: in excluded folder")
+        if self.exclusion_matcher.is_excluded(file_path):
+            self.log_callback(f"Skipped {os.path.basename(file_path)}: excluded")
             return
         
         file_name = os.path.basename(file_path)
         logging.info("Detected create event for %s in %s", file_name, os.path.dirname(file_path))
         
-        is_rename = False
-        original_path = None
-        for deleted_path, deletion_time in list(self.recent_deletions.items()):
-            if time.time() - deletion_time < 5:
-                if os.path.dirname(deleted_path) == os.path.dirname(file_path):
-                    is_rename = True
-                    original_path = deleted_path
-                    del self.recent_deletions[deleted_path]
-                    break
+        stat = self._note_stat(file_path)
+        original_path = self.renames.match_created(file_path, stat)
         
+        self.submit_when_ready(file_path, True, self._process_created, file_path, original_path)
+
+    def _process_created(self, file_path, original_path, deferrals=0):
+        """Organize a created file that is fully written, retrying with backoff on errors."""
+        with PROFILER.span("process_created"):
+            self._organize_created(file_path, original_path, deferrals)
+
+    def _organize_created(self, file_path, original_path, deferrals):
+        """Organize a created file, retrying with backoff on errors."""
+        file_name = os.path.basename(file_path)
         for attempt in range(5):
             try:
-                if os.path.isfile(file_path):
-                    success, message = organize_file(file_path, self.base_folder, self.categories, self.organize_by_date)
-                    if is_rename:
-                        message = f"Renamed {os.path.basename(original_path)} to {file_name}: {message}"
-                    self.log_callback(message)
-                    logging.debug("Successfully processed %s: %s", file_name, message)
+                if not os.path.isfile(file_path):
+                    logging.info("Skipped %s: not a file", file_name)
                     break
-                else:
-                    logging.info("Attempt %d: Skipped %s: file not ready", attempt + 1, file_name)
-                    self.log_callback(f"Attempt {attempt + 1}: Skipped {file_name}: file not ready")
-                    time.sleep(3)
+                stat = os.stat(file_path)
+                config = self.config
+                if self.catalog is not None:
+                    self.catalog.add(file_path, stat, FileCatalog.category_of(file_name, config.categories, config.temp_suffixes))
+                if self._should_defer(file_name, stat, config, deferrals):
+                    logging.info("Deferred large cross-device move of %s while smaller files are waiting", file_name)
+                    self.queue.defer('bulk', DEFER_DELAY, self._process_created, file_path, original_path, deferrals + 1)
+                    return
+                success, message, target_path = organize_file(file_path, self.base_folder, config.categories, config.organize_by_date, config.date_sources, config.routes, self.dirs, config.temp_suffixes)
+                if success:
+                    self._after_move(target_path, stat, config)
+                EVENTS.publish("organized" if success else "skipped", folder=self.base_folder, path=file_path, message=message)
+                if original_path:
+                    message = f"Renamed {os.path.basename(original_path)} to {file_name}: {message}"
+                self.log_callback(message)
+                logging.debug("Successfully processed %s: %s", file_name, message)
+                break
             except PermissionError as e:
                 logging.error("Permission error for %s: %s", file_name, e)
                 self.log_callback(f"Permission error for {file_name}: {str(e)}. Try running as administrator.")
-                time.sleep(3)
+                time.sleep(self.readiness.retry_delay(attempt))
             except FileNotFoundError as e:
                 logging.error("File not found for %s: %s", file_name, e)
                 self.log_callback(f"File not found for {file_name}: {str(e)}")
@@ -257,16 +3485,32 @@ class FileOrganizerHandler(FileSystemEventHandler):
             except Exception as e:
                 logging.error("Error processing %s: %s", file_name, e)
                 self.log_callback(f"Error processing {file_name}: {str(e)}")
-                time.sleep(3)
+                time.sleep(self.readiness.retry_delay(attempt))
         else:
             message = f"Failed to process created file {file_name} after 5 attempts"
             logging.warning(message)
             self.log_callback(message)
+        self.readiness.forget(file_path)
 
     def on_moved(self, event):
-        """Handle file rename events with retry mechanism."""
+        """Handle file rename events, organizing the renamed file once it is fully written."""
         logging.debug("Processing moved event: src_path=%s, dest_path=%s, is_directory=%s", event.src_path, event.dest_path, event.is_directory)
         
+        source_category = None if event.is_directory else self._category_of(event.src_path)
+        if self.stats and source_category and not self._category_of(event.dest_path):
+            try:
+                size = os.path.getsize(event.dest_path)
+            except OSError:
+                size = None
+            self.stats.record_remove(self.base_folder, source_category, os.path.splitext(event.src_path)[1].lower(), size, event.src_path)
+        
+        if event.is_directory:
+            self.dirs.invalidate(event.src_path)
+            self._watch_new_folder(event.dest_path)
+        
+        if self.catalog is not None:
+            self._catalog_move(event)
+        
         if not self.is_running or self.is_paused or event.is_directory:
             self.log_callback(f"Skipped rename event for {event.src_path}: {'stopped' if not self.is_running else 'paused' if self.is_paused else 'directory'}")
             return
@@ -274,12 +3518,21 @@ class FileOrganizerHandler(FileSystemEventHandler):
         file_path = event.dest_path
         file_name = os.path.basename(file_path)
         
-        if any(os.path.normpath(file_path).startswith(os.path.normpath(excl)) for excl in self.exclusions):
-            self.log_callback(f"Skipped {file_name}: in excluded folder")
+        if self.exclusion_matcher.is_excluded(file_path):
+            self.log_callback(f"Skipped {file_name}: excluded")
             return
         
         logging.info("Detected rename event for %s (from %s) in %s", file_name, os.path.basename(event.src_path), os.path.dirname(file_path))
-        
+        self.submit_when_ready(file_path, False, self._process_moved, event.src_path, file_path)
+
+    def _process_moved(self, src_path, file_path, deferrals=0):
+        """Organize a renamed file, retrying with backoff while it is busy or inaccessible."""
+        with PROFILER.span("process_moved"):
+            self._organize_moved(src_path, file_path, deferrals)
+
+    def _organize_moved(self, src_path, file_path, deferrals):
+        """Organize a renamed file once it is ready, retrying with backoff on errors."""
+        file_name = os.path.basename(file_path)
         for attempt in range(5):
             try:
                 logging.debug("Attempt %d: Checking file %s", attempt + 1, file_path)
@@ -290,22 +3543,31 @@ class FileOrganizerHandler(FileSystemEventHandler):
                 if not os.path.isfile(file_path):
                     logging.info("Attempt %d: Skipped %s: not a file", attempt + 1, file_name)
                     self.log_callback(f"Attempt {attempt + 1}: Skipped {file_name}: not a file")
-                    time.sleep(3)
+                    time.sleep(self.readiness.retry_delay(attempt))
                     continue
                 if not os.access(file_path, os.R_OK | os.W_OK):
                     logging.error("Permission error for %s: no read/write access", file_name)
                     self.log_callback(f"Permission error for {file_name}: no read/write access. Try running as administrator.")
-                    time.sleep(3)
+                    time.sleep(self.readiness.retry_delay(attempt))
                     continue
-                success, message = organize_file(file_path, self.base_folder, self.categories, self.organize_by_date)
-                message = f"Renamed {os.path.basename(event.src_path)} to {file_name}: {message}"
+                stat = os.stat(file_path)
+                config = self.config
+                if self._should_defer(file_name, stat, config, deferrals):
+                    logging.info("Deferred large cross-device move of %s while smaller files are waiting", file_name)
+                    self.queue.defer('bulk', DEFER_DELAY, self._process_moved, src_path, file_path, deferrals + 1)
+                    return
+                success, message, target_path = organize_file(file_path, self.base_folder, config.categories, config.organize_by_date, config.date_sources, config.routes, self.dirs, config.temp_suffixes)
+                if success:
+                    self._after_move(target_path, stat, config)
+                EVENTS.publish("organized" if success else "skipped", folder=self.base_folder, path=file_path, renamed_from=src_path, message=message)
+                message = f"Renamed {os.path.basename(src_path)} to {file_name}: {message}"
                 self.log_callback(message)
                 logging.debug("Successfully processed %s: %s", file_name, message)
                 break
             except PermissionError as e:
                 logging.error("Permission error for %s: %s", file_name, e)
                 self.log_callback(f"Permission error for {file_name}: {str(e)}. Try running as administrator.")
-                time.sleep(3)
+                time.sleep(self.readiness.retry_delay(attempt))
             except FileNotFoundError as e:
                 logging.error("File not found for %s: %s", file_name, e)
                 self.log_callback(f"File not found for {file_name}: {str(e)}")
@@ -313,29 +3575,299 @@ class FileOrganizerHandler(FileSystemEventHandler):
             except Exception as e:
                 logging.error("Error processing renamed %s: %s", file_name, e)
                 self.log_callback(f"Error processing renamed {file_name}: {str(e)}")
-                time.sleep(3)
+                time.sleep(self.readiness.retry_delay(attempt))
         else:
             message = f"Failed to process renamed file {file_name} after 5 attempts"
             logging.warning(message)
             self.log_callback(message)
+        self.readiness.forget(file_path)
+
+    def _catalog_move(self, event):
+        """Keep the file catalog in step with a rename of a file or folder."""
+        if event.is_directory:
+            self.catalog.remove_tree(event.src_path)
+            if not self.exclusion_matcher.is_excluded_dir(event.dest_path):
+                self.queue.submit('bulk', self.catalog.scan, event.dest_path, self.exclusion_matcher, self.config.categories, self.config.temp_suffixes)
+            return
+        category = FileCatalog.category_of(os.path.basename(event.dest_path), self.config.categories, self.config.temp_suffixes)
+        if self.exclusion_matcher.is_excluded(event.dest_path):
+            self.catalog.remove(event.src_path)
+        elif not self.catalog.move(event.src_path, event.dest_path, category):
+            try:
+                self.catalog.add(event.dest_path, os.stat(event.dest_path), category)
+            except OSError:
+                pass
+
+    def _watch_new_folder(self, folder):
+        """Watch a folder that appeared inside a non-recursively watched folder above an exclusion."""
+        if not self.recursive or not self.observer or not self.exclusion_matcher.is_spine(os.path.dirname(folder)):
+            return
+        if self.exclusion_matcher.is_excluded_dir(folder) or self.exclusion_matcher.is_spine(folder):
+            return
+        try:
+            self.observer.schedule(self, folder, recursive=True)
+            logging.info("Started watching new folder %s", folder)
+        except Exception as e:
+            logging.error("Error watching new folder %s: %s", folder, e)
+
+    def submit_when_ready(self, file_path, expect_close, fn, *args, attempt=0):
+        """Queue work for a file once the readiness stage finds it completely written.
+
+        The lane is chosen only then, from the file's final size. A file that stays unfinished is looked at
+        again, up to five times in all.
+        """
+        file_name = os.path.basename(file_path)
+        check = self.readiness.begin(file_path, expect_close, lambda: self.is_running)
+
+        def on_done(ready):
+            if ready:
+                self.submit(file_path, None, fn, *args)
+                return
+            if not self.is_running:
+                self.readiness.forget(file_path)
+                return
+            logging.info("Attempt %d: Skipped %s: file not ready", attempt + 1, file_name)
+            self.log_callback(f"Attempt {attempt + 1}: Skipped {file_name}: file not ready")
+            if attempt < 4:
+                self.submit_when_ready(file_path, expect_close, fn, *args, attempt=attempt + 1)
+            else:
+                message = f"Gave up on {file_name}: still being written after 5 attempts"
+                logging.warning(message)
+                self.log_callback(message)
+                self.readiness.forget(file_path)
+
+        self.queue.readiness.watch(check, on_done)
+
+    def submit(self, file_path, stat, fn, *args):
+        """Queue work for a file in the lane chosen by its size, category and this folder's priority."""
+        if stat is None:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                pass
+        config = self.config
+        category = get_category(os.path.basename(file_path), config.categories, config.temp_suffixes)
+        self.queue.submit(choose_lane(stat.st_size if stat else 0, category, self.priority, config.scheduling), fn, *args)
+
+    def _should_defer(self, file_name, stat, config, deferrals):
+        """Return whether a large move that has to copy data should wait for more urgent files."""
+        if deferrals >= MAX_DEFERRALS or stat.st_size < config.scheduling.get("large_file_size", 1024 ** 3):
+            return False
+        if not self.queue.has_urgent_work():
+            return False
+        routes = config.routes.get(get_category(file_name, config.categories, config.temp_suffixes)) or ()
+        return stat.st_dev != self.base_device or any(route.get("action", "copy") == "copy" for route in routes)
+
+    def precreate_target_folders(self, file_paths):
+        """Create the category and date folders a batch of files will be moved into."""
+        config = self.config
+        folders = set()
+        for file_path in file_paths:
+            category = get_category(os.path.basename(file_path), config.categories, config.temp_suffixes)
+            if not category:
+                continue
+            folder = os.path.join(self.base_folder, category)
+            if config.organize_by_date:
+                try:
+                    folder = os.path.join(folder, get_file_date(file_path, category, config.date_sources).strftime('%Y-%m-%d'))
+                except Exception as e:
+                    logging.debug("Error getting timestamp for %s: %s", file_path, e)
+            folders.add(folder)
+        created = self.dirs.precreate(folders)
+        if created:
+            logging.info("Created %d target folders in %s ahead of a backlog", created, self.base_folder)
+        return created
+
+    def _category_of(self, file_path):
+        """Return the category folder a path lies in under the base folder, or None."""
+        try:
+            relative = os.path.relpath(file_path, self.base_folder)
+        except ValueError:  # Different drive on Windows
+            return None
+        top = relative.split(os.sep, 1)[0]
+        if top in self.config.category_names and top != relative:
+            return top
+        return None
+
+    def _after_move(self, target_path, stat, config):
+        """Hand the category folder that received a file to the optional post-move stages."""
+        file_name = os.path.basename(target_path)
+        category = get_category(file_name, config.categories, config.temp_suffixes)
+        if self.stats:
+            self.stats.record_add(self.base_folder, category, stat.st_size, stat.st_mtime, os.path.splitext(file_name)[1].lower(), target_path)
+        if self.archiver:
+            self.archiver.notify(os.path.join(self.base_folder, category))
+
+    def update_config(self, config):
+        """Switch to a new configuration snapshot; events already in progress finish with the old one."""
+        self.config = config
+        logging.info("Handler for %s switched to config version %d", self.base_folder, config.version)
 
     def pause(self):
         """Pause the handler."""
         self.is_paused = True
+        EVENTS.publish("paused", folder=self.base_folder)
         logging.info("Paused file organizer for %s", self.base_folder)
         self.log_callback(f"Paused watching {self.base_folder}")
 
     def resume(self):
         """Resume the handler."""
         self.is_paused = False
+        EVENTS.publish("resumed", folder=self.base_folder)
         logging.info("Resumed file organizer for %s", self.base_folder)
         self.log_callback(f"Resumed watching {self.base_folder}")
 
     def stop(self):
         """Stop the handler."""
         self.is_running = False
+        if self.owns_queue:
+            self.queue.shutdown()
         logging.info("File organizer handler stopped for %s", self.base_folder)
 
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    """HTTP endpoints of the local control API; self.server.app is the FileOrganizerApp."""
+    def log_message(self, format, *args):
+        logging.debug("Control API: " + format, *args)
+
+    def _same_origin(self):
+        """Reject browser requests: any Origin header, or a Host other than the bound address (DNS rebinding)."""
+        host = self.headers.get("Host", "")
+        if not host.endswith("]"):
+            host = host.rsplit(":", 1)[0]
+        if "Origin" in self.headers or host.strip("[]").lower() not in self.server.allowed_hosts:
+            self._send_json(403, {"error": "forbidden"})
+            return False
+        return True
+
+    def _authorized(self):
+        if not self._same_origin():
+            return False
+        token = self.server.token
+        # Constant-time comparison, so response timing does not reveal how much of a guess was right
+        if token and not hmac.compare_digest(self.headers.get("Authorization", "").encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            self._send_json(401, {"error": "unauthorized"})
+            return False
+        return True
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = self.path.split('?', 1)[0]
+        if path == "/status":
+            self._send_json(200, self.server.app.get_status())
+        elif path == "/metrics":
+            self._send_json(200, self.server.app.get_metrics())
+        elif path == "/events":
+            self._stream_events()
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {path}"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        path = self.path.split('?', 1)[0]
+        actions = {
+            "/start": self.server.app.start_watching,
+            "/stop": self.server.app.stop_watching,
+            "/pause": self.server.app.pause_watching,
+            "/resume": self.server.app.resume_watching,
+            "/scan": self.server.app.scan_now,
+            "/reload": self.server.app.reload_config,
+            "/profile": self.server.app.toggle_profiling,
+            "/trace": self.server.app.toggle_trace_recording,
+        }
+        action = actions.get(path)
+        if action is None:
+            self._send_json(404, {"error": f"unknown endpoint {path}"})
+            return
+        if path == "/start" and self.server.app.is_watching:
+            self._send_json(409, {"error": "already watching"})
+            return
+        # GUI state is only touched from the Tk thread
+        self.server.app.root.after(0, action)
+        self._send_json(202, {"accepted": path[1:]})
+
+    def _stream_events(self):
+        """Stream events as newline-delimited JSON until the client disconnects.
+
+        Each subscriber has a bounded queue, so a slow client loses its oldest events (reported in a
+        "dropped" line) instead of slowing the organizer down.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        subscription = EVENTS.subscribe(self.server.max_events)
+        try:
+            while self.server.is_running:
+                events, dropped = subscription.take(timeout=15)
+                lines = []
+                if dropped:
+                    lines.append(json.dumps({"type": "dropped", "count": dropped, "time": time.time()}))
+                lines.extend(json.dumps(event) for event in events)
+                # An empty line doubles as a keepalive that detects closed connections
+                self.wfile.write(("\n".join(lines) + "\n").encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            subscription.close()
+
+class ControlServer:
+    """Local HTTP control API for scripting a running organizer: pause/resume, scan, reload, metrics and events."""
+    def __init__(self, app, settings):
+        self.app = app
+        self.host = settings.get("host", "127.0.0.1")
+        self.port = settings.get("port", 47800)
+        self.token = settings.get("token", "")
+        # Host headers accepted besides the bound address and localhost, e.g. a name the machine is reached by
+        self.allowed_hosts = {host.lower() for host in settings.get("allowed_hosts", [])}
+        self.max_events = settings.get("max_queued_events", 10000)
+        self.server = None
+
+    @staticmethod
+    def is_loopback(host):
+        """Return True for addresses only reachable from this machine."""
+        if host == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    def start(self):
+        """Listen on the configured address in a background thread; a token is required, since any web page can reach loopback."""
+        if not self.token:
+            raise ValueError("refusing to start the control API without a token; set control_api.token")
+        self.server = ThreadingHTTPServer((self.host, self.port), ControlRequestHandler)
+        self.server.daemon_threads = True
+        self.server.app = self.app
+        self.server.token = self.token
+        self.server.allowed_hosts = self.allowed_hosts | {self.host.lower(), "localhost"}
+        if self.is_loopback(self.host):
+            self.server.allowed_hosts |= {"127.0.0.1", "::1"}
+        self.server.max_events = self.max_events
+        self.server.is_running = True
+        threading.Thread(target=self.server.serve_forever, name="control-api", daemon=True).start()
+        logging.info("Control API listening on http://%s:%d", self.host, self.server.server_address[1])
+        return self.server.server_address[1]
+
+    def stop(self):
+        """Stop listening and end open event streams."""
+        if self.server:
+            self.server.is_running = False
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
 class FileOrganizerApp:
     """GUI application for the file organizer."""
     def __init__(self, root):
@@ -356,14 +3888,25 @@ class FileOrganizerApp:
         self.appearance_mode = "system"
         self.organize_by_date = False
         self.folder_settings = {}
+        self.snapshot = None
         self.observers = []
+        self.archiver = None
+        self.stats = FolderStatsIndex()
+        self.catalog = None
+        self.watcher_state = WatcherState()
+        self.catalog_file = 'file_catalog.bin'
+        self.state_lock = threading.Lock()
+        self.state_stop = threading.Event()
+        self.final_state_save = None
         self.handlers = []
         self.is_watching = False
         self.tray = None
+        self.control = None
 
         # Load configuration
         try:
-            self.config = load_config()
+            self.snapshot = get_config_snapshot()
+            self.config = self.snapshot.to_dict()
             self.categories = self.config.get('categories', {})
             self.monitored_folders = self.config.get('monitored_folders', [])
             self.startup_enabled = self.config.get('startup_enabled', False)
@@ -415,6 +3958,9 @@ class FileOrganizerApp:
         self.category_button = ctk.CTkButton(root, text="Edit Categories", command=self.edit_categories)
         self.category_button.pack(pady=5)
 
+        self.stats_button = ctk.CTkButton(root, text="Show Statistics", command=self.show_statistics)
+        self.stats_button.pack(pady=5)
+
         self.control_frame = ctk.CTkFrame(root)
         self.control_frame.pack(pady=5)
         self.start_button = ctk.CTkButton(self.control_frame, text="Start Watching", command=self.start_watching)
@@ -435,6 +3981,8 @@ class FileOrganizerApp:
         self.date_organize_checkbox.pack(side="left", padx=5)
         self.update_button = ctk.CTkButton(self.options_frame, text="Check for Updates", command=self.check_for_updates)
         self.update_button.pack(side="left", padx=5)
+        self.profile_button = ctk.CTkButton(self.options_frame, text="Start Profiling", command=self.toggle_profiling)
+        self.profile_button.pack(side="left", padx=5)
 
         # Initialize log_text after all other widgets
         try:
@@ -485,6 +4033,23 @@ class FileOrganizerApp:
             logging.error("Error creating system tray icon: %s", e)
             self._log_buffer.append(f"Error creating system tray icon: {str(e)}")
 
+        # Start the local control API if enabled
+        control_settings = self.snapshot.raw.get("control_api", {}) if self.snapshot else {}
+        if control_settings.get("enabled"):
+            try:
+                if not control_settings.get("token"):
+                    control_settings = dict(control_settings, token=secrets.token_urlsafe(32))
+                    self.config.setdefault("control_api", {})["token"] = control_settings["token"]
+                    save_config(self.config)
+                    self._log_buffer.append("Generated a control API token; it is control_api.token in categories.json")
+                self.control = ControlServer(self, control_settings)
+                port = self.control.start()
+                self._log_buffer.append(f"Control API listening on {self.control.host}:{port}")
+            except Exception as e:
+                logging.error("Error starting control API: %s", e)
+                self._log_buffer.append(f"Error starting control API: {str(e)}")
+                self.control = None
+
         # Flush buffered log messages to GUI
         if self.log_text:
             for message in self._log_buffer:
@@ -544,12 +4109,42 @@ class FileOrganizerApp:
             self.config['organize_by_date'] = self.organize_by_date
             save_config(self.config)
             self.log_to_gui(f"{'Enabled' if self.organize_by_date else 'Disabled'} organize by date")
-            if self.is_watching:
-                self.restart_watching()
+            self.apply_config()
         except Exception as e:
             logging.error("Error toggling date organization: %s", e)
             self.log_to_gui(f"Error toggling date organization: {str(e)}")
 
+    def toggle_profiling(self):
+        """Start a profiling capture, or stop the running one and report where it was exported."""
+        try:
+            PROFILER.toggle(on_done=lambda paths: self.root.after(0, self._report_profile, paths))
+            self.profile_button.configure(text="Stop Profiling" if PROFILER.enabled else "Start Profiling")
+            if PROFILER.enabled:
+                self.log_to_gui("Profiling started")
+        except Exception as e:
+            logging.error("Error toggling profiling: %s", e)
+            self.log_to_gui(f"Error toggling profiling: {str(e)}")
+
+    def toggle_trace_recording(self, path=None):
+        """Start recording observer events to a trace file, or stop the running recording."""
+        try:
+            if TRACE.enabled:
+                self.log_to_gui(f"Saved event trace with {TRACE.events} events to {TRACE.stop()}")
+            else:
+                path = path or os.path.join("traces", datetime.now().strftime("trace_%Y%m%d_%H%M%S.bin"))
+                TRACE.start(path)
+                self.log_to_gui(f"Recording events to {path}")
+        except Exception as e:
+            logging.error("Error toggling event trace recording: %s", e)
+            self.log_to_gui(f"Error toggling event trace recording: {str(e)}")
+
+    def _report_profile(self, paths):
+        """Show a finished profile's stage summary in the log."""
+        self.profile_button.configure(text="Start Profiling")
+        self.log_to_gui(f"Profile saved to {paths[0]} (flame graph stacks) and {paths[1]}")
+        for line in PROFILER.format_summary().splitlines():
+            self.log_to_gui(line)
+
     def export_log_to_csv(self):
         """Export organizer.log to a CSV file."""
         try:
@@ -646,7 +4241,7 @@ class FileOrganizerApp:
             self.log_to_gui(f"Error removing folder: {str(e)}")
 
     def edit_folder_settings(self):
-        """Open a dialog to edit folder settings (recursive, exclusions)."""
+        """Open a dialog to edit folder settings (recursive, exclusions, priority)."""
         try:
             selected = self.folder_listbox.curselection()
             if not selected:
@@ -657,14 +4252,21 @@ class FileOrganizerApp:
             folder = self.folder_listbox.get(selected[0])
             dialog = ctk.CTkToplevel(self.root)
             dialog.title(f"Edit Settings for {folder}")
-            dialog.geometry("400x300")
+            dialog.geometry("400x340")
             dialog.attributes('-topmost', True)
             dialog.grab_set()
 
             recursive_var = tk.BooleanVar(value=self.folder_settings.get(folder, {}).get("recursive", False))
             ctk.CTkCheckBox(dialog, text="Monitor Subfolders (Recursive)", variable=recursive_var).pack(pady=5)
 
-            ctk.CTkLabel(dialog, text="Excluded Subfolders:").pack(pady=5)
+            priority_frame = ctk.CTkFrame(dialog)
+            priority_frame.pack(pady=5)
+            ctk.CTkLabel(priority_frame, text="Priority:").pack(side="left", padx=5)
+            priority_option = ctk.CTkOptionMenu(priority_frame, values=["high", "normal", "low"])
+            priority_option.set(self.folder_settings.get(folder, {}).get("priority", "normal"))
+            priority_option.pack(side="left", padx=5)
+
+            ctk.CTkLabel(dialog, text="Excluded Subfolders and Patterns:").pack(pady=5)
             exclusion_listbox = tk.Listbox(dialog, height=5)
             exclusion_listbox.pack(pady=5, fill="both", expand=True, padx=10)
             exclusions = self.folder_settings.get(folder, {}).get("exclusions", [])
@@ -678,6 +4280,13 @@ class FileOrganizerApp:
                     exclusion_listbox.insert(tk.END, excl_folder)
                     self.log_to_gui(f"Added exclusion {excl_folder} for {folder}")
 
+            def add_pattern():
+                pattern = ctk.CTkInputDialog(text="Enter a glob pattern (e.g., **/node_modules/** or *.part):", title="Add Pattern").get_input()
+                if pattern and is_glob_pattern(pattern) and pattern not in exclusions:
+                    exclusions.append(pattern)
+                    exclusion_listbox.insert(tk.END, pattern)
+                    self.log_to_gui(f"Added exclusion pattern {pattern} for {folder}")
+
             def remove_exclusion():
                 selected_excl = exclusion_listbox.curselection()
                 if selected_excl:
@@ -689,16 +4298,18 @@ class FileOrganizerApp:
             button_frame = ctk.CTkFrame(dialog)
             button_frame.pack(pady=5)
             ctk.CTkButton(button_frame, text="Add Exclusion", command=add_exclusion).pack(side="left", padx=5)
+            ctk.CTkButton(button_frame, text="Add Pattern", command=add_pattern).pack(side="left", padx=5)
             ctk.CTkButton(button_frame, text="Remove Exclusion", command=remove_exclusion).pack(side="left", padx=5)
 
             def save_settings():
                 self.folder_settings[folder] = {
                     "recursive": recursive_var.get(),
-                    "exclusions": exclusions
+                    "exclusions": exclusions,
+                    "priority": priority_option.get()
                 }
                 self.config['folder_settings'] = self.folder_settings
                 save_config(self.config)
-                self.log_to_gui(f"Updated settings for {folder}: recursive={recursive_var.get()}, exclusions={exclusions}")
+                self.log_to_gui(f"Updated settings for {folder}: recursive={recursive_var.get()}, exclusions={exclusions}, priority={priority_option.get()}")
                 if self.is_watching:
                     self.restart_watching()
                 dialog.attributes('-topmost', False)
@@ -742,8 +4353,7 @@ class FileOrganizerApp:
                         self.config['categories'] = self.categories
                         save_config(self.config)
                         self.log_to_gui(f"Added category: {ext.lower()} -> {category}")
-                        if self.is_watching:
-                            self.restart_watching()
+                        self.apply_config()
 
             def remove_category():
                 selected = listbox.curselection()
@@ -755,8 +4365,7 @@ class FileOrganizerApp:
                     self.config['categories'] = self.categories
                     save_config(self.config)
                     self.log_to_gui(f"Removed category: {ext}")
-                    if self.is_watching:
-                        self.restart_watching()
+                    self.apply_config()
 
             button_frame = ctk.CTkFrame(dialog)
             button_frame.pack(pady=5)
@@ -774,9 +4383,64 @@ class FileOrganizerApp:
             logging.error("Error editing categories: %s", e)
             self.log_to_gui(f"Error editing categories: {str(e)}")
 
+    def apply_config(self):
+        """Publish the edited configuration to running handlers as a new immutable snapshot."""
+        self.snapshot = ConfigSnapshot(self.config)
+        for handler in self.handlers:
+            handler.update_config(self.snapshot)
+
+    def show_statistics(self):
+        """Open a dialog with the per-folder category statistics from the stats index."""
+        try:
+            dialog = ctk.CTkToplevel(self.root)
+            dialog.title("Folder Statistics")
+            dialog.geometry("700x400")
+            dialog.attributes('-topmost', True)
+
+            textbox = ctk.CTkTextbox(dialog, font=("Courier New", 12))
+            textbox.pack(pady=10, fill="both", expand=True, padx=10)
+
+            def refresh():
+                textbox.configure(state="normal")
+                textbox.delete("1.0", tk.END)
+                textbox.insert(tk.END, self.stats.format_summary())
+                if self.handlers:
+                    textbox.insert(tk.END, f"\n\n{self.handlers[0].queue.format_metrics()}")
+                    textbox.insert(tk.END, f"\nLoad: {LOAD.mode} ({LOAD.reason})")
+                if self.catalog is not None:
+                    textbox.insert(tk.END, f"\n\nCatalog: {len(self.catalog)} files in memory ({self.catalog.bytes_per_file():.0f} bytes per file)")
+                textbox.configure(state="disabled")
+
+            def rescan():
+                snapshot = ConfigSnapshot(self.config)
+
+                def run_rescan():
+                    for folder in snapshot.monitored_folders:
+                        try:
+                            matcher = ExclusionMatcher(folder, snapshot.settings_for(folder)["exclusions"])
+                            self.stats.reconcile(folder, snapshot.category_names, matcher)
+                        except Exception as e:
+                            logging.error("Error rescanning statistics for %s: %s", folder, e)
+                    self.root.after(0, refresh)
+
+                threading.Thread(target=run_rescan, daemon=True).start()
+                self.log_to_gui("Rescanning folder statistics...")
+
+            button_frame = ctk.CTkFrame(dialog)
+            button_frame.pack(pady=5)
+            ctk.CTkButton(button_frame, text="Refresh", command=refresh).pack(side="left", padx=5)
+            ctk.CTkButton(button_frame, text="Rescan", command=rescan).pack(side="left", padx=5)
+            refresh()
+        except Exception as e:
+            logging.error("Error showing statistics: %s", e)
+            self.log_to_gui(f"Error showing statistics: {str(e)}")
+
     def start_watching(self):
         """Start the file watchers in a separate thread."""
         try:
+            if self.is_watching:
+                self.log_to_gui("Already watching.")
+                return
             if not self.monitored_folders:
                 self.log_to_gui("Error: No folders selected to monitor.")
                 messagebox.showerror("Error", "No folders selected to monitor.")
@@ -788,17 +4452,46 @@ class FileOrganizerApp:
             self.stop_button.configure(state="normal")
             self.status_label.configure(text="Status: Watching", text_color="green")
             
+            self.snapshot = ConfigSnapshot(self.config)
+            self.state_stop = threading.Event()
+            if self.snapshot.archiving.get("enabled"):
+                self.archiver = ArchiveBundler(self.snapshot.archiving, self.log_to_gui, self.snapshot.monitored_folders)
+                self.archiver.start()
+            
             def run_watchers():
                 try:
+                    if self.final_state_save:
+                        self.final_state_save.join()  # A restart must read the state the last stop wrote
+                    self.stats.start([
+                        (folder, self.snapshot.category_names, ExclusionMatcher(folder, self.snapshot.settings_for(folder)["exclusions"]))
+                        for folder in self.snapshot.monitored_folders
+                    ])
+                    catalog = FileCatalog()
+                    catalog_loaded = catalog.load(self.catalog_file, self._catalog_signature())
+                    self.catalog = catalog
+                    state = WatcherState(self.watcher_state.state_file)
+                    state.load()
                     self.observers, self.handlers = start_watcher(
-                        self.monitored_folders,
-                        self.categories,
+                        self.snapshot,
                         self.log_to_gui,
-                        self.folder_settings,
-                        self.organize_by_date
+                        self.archiver,
+                        self.stats,
+                        self.catalog,
+                        state
                     )
+                    if self.handlers:
+                        LOAD.start(self.handlers[0].queue, self.snapshot.raw.get("throttling", {}))
+                    catch_up_missed_files(self.handlers, state, self.log_to_gui)
+                    state.close()
+                    threading.Thread(target=self._save_state_periodically, args=(self.handlers, self.state_stop),
+                                     name="state-saver", daemon=True).start()
+                    # A saved catalog only needs the folders that changed since it was written
+                    update = self.catalog.refresh if catalog_loaded else self.catalog.scan
+                    for handler in self.handlers:
+                        update(handler.base_folder, handler.exclusion_matcher, self.snapshot.categories, self.snapshot.temp_suffixes)
+                    self.log_to_gui(f"Cataloged {len(self.catalog)} files ({self.catalog.bytes_per_file():.0f} bytes per file)")
                     watched_folders = [handler.base_folder for handler in self.handlers]
-                    configured_folders = set(self.monitored_folders)
+                    configured_folders = set(self.snapshot.monitored_folders)
                     missing_folders = configured_folders - set(watched_folders)
                     if missing_folders:
                         self.log_to_gui(f"Warning: Failed to start watchers for {', '.join(missing_folders)}")
@@ -836,12 +4529,53 @@ class FileOrganizerApp:
             logging.error("Error resuming watching: %s", e)
             self.log_to_gui(f"Error resuming watching: {str(e)}")
 
+    def save_watcher_state(self, handlers):
+        """Capture and save the folder snapshots of the given handlers; walks every watched tree, so never call it on the Tk thread."""
+        records = []
+        for handler in handlers:
+            try:
+                records.append(WatcherState.capture(handler))
+            except OSError as e:
+                logging.error("Error capturing watcher state for %s: %s", handler.base_folder, e)
+        with self.state_lock:
+            if records:
+                self.watcher_state.save(records)
+            if self.catalog is not None:
+                self.catalog.save(self.catalog_file, self._catalog_signature())
+
+    def _catalog_signature(self):
+        """Return the settings a saved catalog depends on; a catalog saved under other settings is rebuilt."""
+        snapshot = self.snapshot
+        return json.dumps([dict(snapshot.categories), sorted(snapshot.temp_suffixes), list(snapshot.monitored_folders),
+                           {folder: list(settings["exclusions"]) for folder, settings in snapshot.folder_settings.items()}],
+                          sort_keys=True)
+
+    def _save_state_periodically(self, handlers, stop_event):
+        """Save the watcher state every SAVE_INTERVAL seconds until watching stops."""
+        while not stop_event.wait(WatcherState.SAVE_INTERVAL):
+            self.save_watcher_state(handlers)
+
+    def _finish_stop(self, handlers, archiver):
+        """Wait for the archiver and statistics threads and save the watcher state; all can take a while, so this runs off the Tk thread."""
+        if archiver:
+            archiver.stop()
+        self.stats.stop()
+        self.save_watcher_state(handlers)
+
     def stop_watching(self):
         """Stop all file watchers."""
         try:
+            handlers = self.handlers
+            self.state_stop.set()
+            LOAD.stop()
             stop_watcher(self.observers, self.handlers)
+            # Files arriving after the watchers stop are left in place, so the capture marks their folders for a relist.
+            # It is not a daemon thread, so exiting the app waits for the save to finish.
+            self.final_state_save = threading.Thread(target=self._finish_stop, args=(handlers, self.archiver), name="state-saver")
+            self.final_state_save.start()
             self.observers = []
             self.handlers = []
+            self.archiver = None
             self.is_watching = False
             self.start_button.configure(state="normal")
             self.pause_button.configure(state="disabled", text="Pause Watching", command=self.pause_watching)
@@ -852,6 +4586,63 @@ class FileOrganizerApp:
             logging.error("Error stopping watching: %s", e)
             self.log_to_gui(f"Error stopping watching: {str(e)}")
 
+    def scan_now(self):
+        """Queue loose files in all watched folders, e.g. ones missed while paused."""
+        try:
+            if not self.handlers:
+                self.log_to_gui("Error: Start watching before scanning.")
+                return
+            threading.Thread(target=scan_folders, args=(list(self.handlers), self.log_to_gui), daemon=True).start()
+        except Exception as e:
+            logging.error("Error scanning folders: %s", e)
+            self.log_to_gui(f"Error scanning folders: {str(e)}")
+
+    def reload_config(self):
+        """Reload the config file and apply it, restarting watchers if folders or folder settings changed."""
+        try:
+            previous = self.snapshot
+            self.snapshot = get_config_snapshot()
+            self.config = self.snapshot.to_dict()
+            self.categories = self.config.get('categories', {})
+            self.monitored_folders = self.config.get('monitored_folders', [])
+            self.organize_by_date = self.config.get('organize_by_date', False)
+            self.folder_settings = self.config.get('folder_settings', {})
+            self.folder_listbox.delete(0, tk.END)
+            for folder in self.monitored_folders:
+                self.folder_listbox.insert(tk.END, folder)
+            if previous and (previous.monitored_folders != self.snapshot.monitored_folders
+                             or previous.folder_settings != self.snapshot.folder_settings):
+                self.restart_watching()
+            else:
+                for handler in self.handlers:
+                    handler.update_config(self.snapshot)
+            self.log_to_gui(f"Reloaded configuration (version {self.snapshot.version})")
+        except Exception as e:
+            logging.error("Error reloading configuration: %s", e)
+            self.log_to_gui(f"Error reloading configuration: {str(e)}")
+
+    def get_status(self):
+        """Return the watcher state for the control API."""
+        return {
+            "watching": self.is_watching,
+            "paused": any(handler.is_paused for handler in self.handlers),
+            "folders": [handler.base_folder for handler in self.handlers],
+            "config_version": self.snapshot.version if self.snapshot else None,
+            "version": APP_VERSION,
+        }
+
+    def get_metrics(self):
+        """Return queue, catalog, statistics and event counters for the control API."""
+        return {
+            "queue": self.handlers[0].queue.metrics() if self.handlers else None,
+            "catalog_files": len(self.catalog) if self.catalog is not None else 0,
+            "stats": self.stats.summary(),
+            "events_published": EVENTS.published,
+            "event_subscribers": len(EVENTS.subscribers),
+            "profiling": PROFILER.enabled,
+            "throttling": LOAD.metrics(),
+        }
+
     def restart_watching(self):
         """Restart watchers after configuration changes."""
         try:
@@ -905,6 +4696,9 @@ class FileOrganizerApp:
                 self.stop_watching()
             if self.tray:
                 self.tray.stop()
+            if self.control:
+                self.control.stop()
+            TRACE.stop()
             self.root.quit()
             self.log_to_gui("Application exited.")
         except Exception as e:
@@ -934,12 +4728,16 @@ class FileOrganizerApp:
             def on_show(icon, item):
                 self.root.after(0, self.restore_from_tray)
 
+            def on_profile(icon, item):
+                self.root.after(0, self.toggle_profiling)
+
             def on_exit(icon, item):
                 self.root.after(0, self.exit_app)
 
             menu = pystray.Menu(
                 pystray.MenuItem("Start Organizing", on_start),
                 pystray.MenuItem("Stop Organizing", on_stop),
+                pystray.MenuItem("Start/Stop Profiling", on_profile),
                 pystray.MenuItem("Show", on_show),
                 pystray.MenuItem("Exit", on_exit)
             )
@@ -990,18 +4788,29 @@ class FileOrganizerApp:
         finally:
             pythoncom.CoUninitialize()
 
-def start_watcher(folders, categories, log_callback, folder_settings, organize_by_date):
-    """Start file system watchers for multiple folders with settings."""
+def start_watcher(config, log_callback, archiver=None, stats=None, catalog=None, state=None):
+    """Start file system watchers for the monitored folders of a config snapshot.
+
+    With a loaded WatcherState, folders that are the same directory as last time skip the access check.
+    Observers are started in parallel because registering recursive watches dominates startup time.
+    All handlers share one OrganizeQueue so lanes are prioritized across folders.
+    """
     observers = []
     handlers = []
+    pending = []
+    queue = OrganizeQueue(HANDLER_WORKERS * max(1, len(config.monitored_folders)), config.scheduling.get("weights"))
     
-    for folder in folders:
+    for folder in config.monitored_folders:
         if not os.path.isabs(folder) or '\x0c' in folder:
             logging.error("Invalid folder path: %s", folder)
             log_callback(f"Invalid folder path: {folder}")
             continue
         
-        if not os.path.exists(folder):
+        try:
+            folder_stat = os.stat(folder)
+        except OSError:
+            folder_stat = None
+        if folder_stat is None:
             try:
                 os.makedirs(folder, exist_ok=True)
                 logging.info("Created folder %s", folder)
@@ -1010,38 +4819,102 @@ def start_watcher(folders, categories, log_callback, folder_settings, organize_b
                 logging.error("Error creating folder %s: %s", folder, e)
                 log_callback(f"Error creating folder {folder}: {str(e)}")
                 continue
-        elif not os.access(folder, os.R_OK | os.W_OK):
+        elif not (state and state.is_unchanged_folder(folder, folder_stat)) and not os.access(folder, os.R_OK | os.W_OK):
             logging.error("No read/write access to folder %s", folder)
             log_callback(f"No read/write access to folder {folder}. Try running as administrator.")
             continue
         
         try:
-            settings = folder_settings.get(folder, {"recursive": True, "exclusions": []})
+            settings = config.settings_for(folder)
             event_handler = FileOrganizerHandler(
                 folder,
-                categories,
+                config,
                 log_callback,
-                recursive=settings["recursive"],
-                exclusions=settings["exclusions"],
-                organize_by_date=organize_by_date
+                archiver=archiver,
+                stats=stats,
+                catalog=catalog,
+                queue=queue
             )
             observer = Observer()
-            observer.schedule(event_handler, folder, recursive=settings["recursive"])
-            observer.start()
-            logging.info("Started file watcher for %s (recursive=%s)", folder, settings["recursive"])
-            log_callback(f"Started file watcher for {folder} (recursive={settings['recursive']})")
-            observers.append(observer)
-            handlers.append(event_handler)
+            for watch_folder, watch_recursive in event_handler.exclusion_matcher.watch_plan(settings["recursive"]):
+                observer.schedule(event_handler, watch_folder, recursive=watch_recursive)
+            event_handler.observer = observer
+            pending.append((folder, settings, event_handler, observer))
         except Exception as e:
             logging.error("Error starting watcher for %s: %s", folder, e)
             log_callback(f"Error starting watcher for {folder}: {str(e)}")
     
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as pool:
+            started = [(item, pool.submit(item[3].start)) for item in pending]
+        for (folder, settings, event_handler, observer), future in started:
+            try:
+                future.result()
+                logging.info("Started file watcher for %s (recursive=%s)", folder, settings["recursive"])
+                log_callback(f"Started file watcher for {folder} (recursive={settings['recursive']})")
+                observers.append(observer)
+                handlers.append(event_handler)
+            except Exception as e:
+                event_handler.stop()
+                logging.error("Error starting watcher for %s: %s", folder, e)
+                log_callback(f"Error starting watcher for {folder}: {str(e)}")
+    
     if not observers:
+        queue.shutdown()
         logging.warning("No watchers started for any folders")
         log_callback("Warning: No watchers started. Check folder paths and permissions.")
     
     return observers, handlers
 
+def catch_up_missed_files(handlers, state, log_callback):
+    """Queue files that appeared while the organizer was not running, using the saved watcher state."""
+    total = 0
+    for handler in handlers:
+        try:
+            missed = state.missed_files(handler)
+        except Exception as e:
+            logging.error("Error catching up on %s: %s", handler.base_folder, e)
+            continue
+        try:
+            handler.precreate_target_folders(missed)
+        except Exception as e:
+            logging.error("Error creating target folders in %s: %s", handler.base_folder, e)
+        for file_path in missed:
+            handler.submit_when_ready(file_path, True, handler._process_created, file_path, None)
+        if missed:
+            logging.info("Queued %d files that arrived in %s while not watching", len(missed), handler.base_folder)
+        total += len(missed)
+    if total:
+        log_callback(f"Catching up on {total} file(s) added while not watching")
+    return total
+
+def scan_folders(handlers, log_callback):
+    """Queue every file in the monitored folders that is not inside a category folder yet."""
+    total = 0
+    for handler in handlers:
+        queued = 0
+        try:
+            with os.scandir(handler.base_folder) as entries:
+                top_level = list(entries)
+            for entry in top_level:
+                if entry.is_file(follow_symlinks=False):
+                    files = [entry] if not handler.exclusion_matcher.is_excluded(entry.path) else []
+                elif (handler.recursive and entry.is_dir(follow_symlinks=False)
+                        and entry.name not in handler.config.category_names
+                        and not handler.exclusion_matcher.is_excluded_dir(entry.path)):
+                    files = handler.exclusion_matcher.walk(entry.path)
+                else:
+                    continue
+                for file_entry in files:
+                    handler.submit_when_ready(file_entry.path, True, handler._process_created, file_entry.path, None)
+                    queued += 1
+        except OSError as e:
+            logging.error("Error scanning %s: %s", handler.base_folder, e)
+        logging.info("Scan queued %d files in %s", queued, handler.base_folder)
+        total += queued
+    log_callback(f"Scan queued {total} file(s) for organizing")
+    return total
+
 def stop_watcher(observers, handlers):
     """Stop all file system watchers."""
     try:
@@ -1049,16 +4922,216 @@ def stop_watcher(observers, handlers):
             observer.stop()
             observer.join()
             handler.stop()
+        for queue in {id(handler.queue): handler.queue for handler in handlers}.values():
+            queue.shutdown()
         logging.info("Stopped all file watchers")
     except Exception as e:
         logging.error("Error stopping watchers: %s", e)
 
+def wait_until_queue_idle(queue, settle=1.0, timeout=120):
+    """Wait until an OrganizeQueue has had nothing queued, running or waiting to be written for settle seconds."""
+    deadline = time.monotonic() + timeout
+    idle_since = None
+    while time.monotonic() < deadline:
+        metrics = queue.metrics()
+        busy = metrics["waiting_ready"] or any(metrics[lane]["queued"] or metrics[lane]["running"] for lane in LANES)
+        if busy:
+            idle_since = None
+        elif idle_since is None:
+            idle_since = time.monotonic()
+        elif time.monotonic() - idle_since >= settle:
+            return True
+        time.sleep(0.05)
+    return False
+
+class TraceReplayer:
+    """Recreate a recorded event trace on a synthetic tree watched by the normal observer and handler.
+
+    File contents are zero-filled to the recorded sizes, files stay open between their recorded create
+    and close events, and speed scales the recorded timing (0 replays as fast as possible). Recorded
+    events inside category folders came from the organizer itself and are left to the replayed one,
+    except deletions of organized files.
+    """
+    def __init__(self, trace_path, root, speed=1.0, workers=HANDLER_WORKERS):
+        self.trace_path = trace_path
+        self.root = root
+        self.speed = speed
+        self.workers = workers
+        self.open_files = {}
+        self.applied = 0
+        self.skipped = 0
+
+    def run(self):
+        """Replay the trace and return a report with timing, throughput and queue metrics."""
+        folders, events = read_trace(self.trace_path)
+        config = get_default_config()
+        bases = [os.path.join(self.root, f"folder{i}") for i in range(len(folders))]
+        config.update({
+            "monitored_folders": bases,
+            "folder_settings": {base: {"recursive": True, "exclusions": []} for base in bases},
+            "routes": {},
+        })
+        snapshot = ConfigSnapshot(config)
+        # Traces from platforms without close events have to close files straight after writing them
+        has_close_events = any(event[1] == 'closed' for event in events)
+        queue = OrganizeQueue(self.workers, snapshot.scheduling.get("weights"))
+        subscription = EVENTS.subscribe(max_events=10 * len(events) + 1000)
+        observers = []
+        handlers = []
+        for base in bases:
+            os.makedirs(base, exist_ok=True)
+            handler = FileOrganizerHandler(base, snapshot, lambda message: logging.debug("Replay: %s", message), queue=queue)
+            observer = Observer()
+            observer.schedule(handler, base, recursive=True)
+            handler.observer = observer
+            observer.start()
+            observers.append(observer)
+            handlers.append(handler)
+        started = time.monotonic()
+        try:
+            for offset, event_type, is_directory, folder_id, size, path, dest in events:
+                if self.speed:
+                    delay = started + offset / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                try:
+                    applied = self._apply(snapshot, bases[folder_id], event_type, is_directory, size, path, dest, has_close_events)
+                except OSError as e:
+                    logging.debug("Replay of %s %s failed: %s", event_type, path, e)
+                    applied = False
+                if applied:
+                    self.applied += 1
+                else:
+                    self.skipped += 1
+            for handle in self.open_files.values():
+                handle.close()
+            self.open_files = {}
+            replayed = time.monotonic()
+            wait_until_queue_idle(queue)
+            finished = time.monotonic()
+        finally:
+            for observer in observers:
+                observer.stop()
+                observer.join()
+            for handler in handlers:
+                handler.stop()
+            queue.shutdown()
+            subscription.close()
+        results, dropped = subscription.take(timeout=0)
+        organized = sum(1 for result in results if result["type"] == "organized")
+        return {
+            "trace": self.trace_path,
+            "events": len(events),
+            "recorded_seconds": round(events[-1][0], 3) if events else 0.0,
+            "speed": self.speed or "max",
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "replay_seconds": round(replayed - started, 3),
+            "total_seconds": round(finished - started, 3),
+            "organized": organized,
+            "organized_per_second": round(organized / (finished - started), 1) if finished > started else 0.0,
+            "dropped_results": dropped,
+            "queue": queue.metrics(),
+        }
+
+    def _apply(self, snapshot, base, event_type, is_directory, size, path, dest, has_close_events):
+        """Perform the filesystem change behind one recorded event; returns False if it was skipped."""
+        target = dest if event_type == 'moved' else path
+        in_category = target.split('/', 1)[0] in snapshot.category_names and '/' in target
+        if in_category and event_type != 'deleted':
+            return False
+        full_path = os.path.join(base, *path.split('/'))
+        if event_type == 'created' and is_directory:
+            os.makedirs(full_path, exist_ok=True)
+        elif event_type in ('created', 'modified') and not is_directory:
+            handle = self.open_files.get(full_path)
+            if handle is None:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                handle = self.open_files[full_path] = open(full_path, 'ab')
+            if size is not None:
+                handle.truncate(size)
+                handle.flush()
+            if not has_close_events:
+                self.open_files.pop(full_path).close()
+        elif event_type == 'closed':
+            handle = self.open_files.pop(full_path, None)
+            if handle is None:
+                return False
+            handle.close()
+        elif event_type == 'deleted':
+            handle = self.open_files.pop(full_path, None)
+            if handle:
+                handle.close()
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path)
+            elif os.path.lexists(full_path):
+                os.remove(full_path)
+            else:
+                return False
+        elif event_type == 'moved':
+            dest_path = os.path.join(base, *dest.split('/'))
+            if not os.path.lexists(full_path) or os.path.lexists(dest_path):
+                return False
+            handle = self.open_files.pop(full_path, None)
+            if handle:
+                self.open_files[dest_path] = handle
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            os.rename(full_path, dest_path)
+        else:
+            return False
+        return True
+
+def run_trace_replay(argv):
+    """Replay the trace named after --replay-trace and print the report; returns the exit status."""
+    def option(name, default):
+        if name in argv and argv.index(name) + 1 < len(argv):
+            return argv[argv.index(name) + 1]
+        return default
+    trace_path = option("--replay-trace", None)
+    try:
+        if trace_path is None or trace_path.startswith("--"):
+            raise ValueError("--replay-trace needs a trace file")
+        with open(trace_path, 'rb') as f:
+            if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+                raise ValueError(f"{trace_path} is not an event trace")
+        speed = option("--speed", "1")
+        speed = 0 if speed == "max" else float(speed)
+        workers = int(option("--workers", HANDLER_WORKERS))
+        if speed < 0 or workers < 1:
+            raise ValueError("--speed must not be negative and --workers must be at least 1")
+    except (OSError, ValueError) as e:
+        print(f"usage: organizer.py --replay-trace FILE [--speed N|max] [--workers N] [--keep]\nerror: {e}", file=sys.stderr)
+        return 2
+    root = tempfile.mkdtemp(prefix="organizer-replay-")
+    try:
+        replayer = TraceReplayer(trace_path, root, speed=speed, workers=workers)
+        report = replayer.run()
+    finally:
+        if "--keep" not in argv:
+            shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    return 0
+
 def main():
     """Run the GUI application."""
+    if "--stats" in sys.argv:
+        print(FolderStatsIndex().format_summary())
+        return
+    if "--replay-trace" in sys.argv:
+        sys.exit(run_trace_replay(sys.argv))
     try:
         ctk.set_appearance_mode("System")
         root = ctk.CTk()
         app = FileOrganizerApp(root)
+        if hasattr(signal, 'SIGUSR1'):
+            # kill -USR1 <pid> toggles profiling in a running instance
+            signal.signal(signal.SIGUSR1, lambda signum, frame: root.after(0, app.toggle_profiling))
+        if "--profile" in sys.argv:
+            app.toggle_profiling()
+        if "--record-trace" in sys.argv:
+            index = sys.argv.index("--record-trace")
+            following = sys.argv[index + 1] if index + 1 < len(sys.argv) else None
+            app.toggle_trace_recording(following if following and not following.startswith("--") else None)
         if app.startup_enabled and "--minimized" in sys.argv:
             app.minimize_to_tray()
         root.mainloop()
@@ -0,0 +1,380 @@
+"""Stress harness for the organizer: concurrent writers, renamers and deleters against a watched temporary tree.
+
+Run by test_stress.py, or by hand from the repository root:
+python -m tests.stress_harness [--replay] [--seed N] [--workers N] [--operations N] [--scenario mixed|latency|trace]
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+from watchdog.observers import Observer
+
+from organizer import (
+    EVENTS,
+    HANDLER_WORKERS,
+    TRACE,
+    TRACE_FLUSH_INTERVAL,
+    ConfigSnapshot,
+    FileCatalog,
+    FileOrganizerHandler,
+    FolderStatsIndex,
+    OrganizeQueue,
+    get_category,
+    get_default_config,
+    read_trace,
+    wait_until_queue_idle,
+)
+
+
+class StressHarness:
+    """Hammer a temporary tree with concurrent writers, renamers and deleters while a handler organizes it,
+    then check that no file was lost, clobbered or moved twice and that the statistics and catalog agree.
+
+    With replay=True the operations run one at a time in an order fixed by the seed, which makes a failing
+    run much easier to reproduce, although the observer and organize workers still interleave with them;
+    otherwise each actor runs in its own thread (seeded, but interleaved by the OS). The report doubles as
+    a throughput benchmark under contention.
+    """
+    NAMES = [f"file{i}" for i in range(40)]  # Small pool so writers collide on names
+    EXTENSIONS = ['.pdf', '.txt', '.jpg', '.png', '.mp4', '.zip', '.py', '.xyz', '.tmp', '.crdownload']
+    HEADER_SIZE = 32
+
+    def __init__(self, root, seed=0, workers=HANDLER_WORKERS, writers=4, renamers=2, deleters=1, operations=2000, max_size=64 * 1024, replay=False):
+        self.root = root
+        self.base_folder = os.path.join(root, "watched")
+        self.seed = seed
+        self.workers = workers
+        self.actors = [('write', i) for i in range(writers)] + [('rename', i) for i in range(renamers)] + [('delete', i) for i in range(deleters)]
+        self.operations = operations
+        self.max_size = max_size
+        self.replay = replay
+        self.ledger = {}  # token -> [size, crc32, deleted]
+        self.ledger_lock = threading.Lock()
+        # Renames and deletes of one path must not interleave, or a deleter could remove a file it did not read
+        self.mutation_lock = threading.Lock()
+        self.counts = dict.fromkeys(('write', 'rename', 'delete', 'skipped'), 0)
+        self.config = None
+
+    def _start(self):
+        """Start a handler watching the base folder and return (stats, catalog, queue, handler, subscription, observer)."""
+        os.makedirs(self.base_folder, exist_ok=True)
+        # Built-in defaults rather than the user's categories.json, so runs are comparable between machines
+        config = get_default_config()
+        config.update({
+            "monitored_folders": [self.base_folder],
+            "folder_settings": {self.base_folder: {"recursive": True, "exclusions": []}},
+            "organize_by_date": False,
+            "routes": {},
+        })
+        self.config = ConfigSnapshot(config)
+        # Watches on category folders created mid-run lag a few milliseconds behind, and deletes in that
+        # window are invisible to any observer, so the folders exist before watching starts
+        for category in self.config.category_names:
+            os.makedirs(os.path.join(self.base_folder, category), exist_ok=True)
+        stats = FolderStatsIndex(stats_file=os.path.join(self.root, "stress_stats.json"))
+        catalog = FileCatalog()
+        queue = OrganizeQueue(self.workers, self.config.scheduling.get("weights"))
+        handler = FileOrganizerHandler(self.base_folder, self.config, lambda message: logging.debug("Stress: %s", message),
+                                       stats=stats, catalog=catalog, queue=queue)
+        subscription = EVENTS.subscribe(max_events=10 * self.operations + 1000)
+        observer = Observer()
+        observer.schedule(handler, self.base_folder, recursive=True)
+        handler.observer = observer
+        observer.start()
+        return stats, catalog, queue, handler, subscription, observer
+
+    @staticmethod
+    def _stop(queue, handler, subscription, observer):
+        observer.stop()
+        observer.join()
+        handler.stop()
+        queue.shutdown()
+        subscription.close()
+
+    def run(self):
+        """Run the workload and return a report with throughput and any invariant violations."""
+        stats, catalog, queue, handler, subscription, observer = self._start()
+        started = time.monotonic()
+        try:
+            if self.replay:
+                rng = random.Random(self.seed)
+                actor_rngs = {actor: random.Random(f"{self.seed}-{actor[0]}-{actor[1]}") for actor in self.actors}
+                for _ in range(self.operations):
+                    actor = rng.choice(self.actors)
+                    self._operate(actor, actor_rngs[actor])
+            else:
+                per_actor = max(1, self.operations // len(self.actors))
+                threads = [threading.Thread(target=self._run_actor, args=(actor, per_actor), daemon=True) for actor in self.actors]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            workload_done = time.monotonic()
+            wait_until_queue_idle(queue)
+            finished = time.monotonic()
+        finally:
+            self._stop(queue, handler, subscription, observer)
+        events, dropped = subscription.take(timeout=0)
+        organized = [event for event in events if event["type"] == "organized"]
+        violations = self.check(events, stats, catalog)
+        if dropped:
+            violations.append(f"{dropped} organizer events were dropped; moved-twice check is incomplete")
+        elapsed = finished - started
+        return {
+            "seed": self.seed,
+            "mode": "replay" if self.replay else "concurrent",
+            "workers": self.workers,
+            "operations": dict(self.counts),
+            "organized": len(organized),
+            "workload_seconds": round(workload_done - started, 3),
+            "total_seconds": round(elapsed, 3),
+            "organized_per_second": round(len(organized) / elapsed, 1) if elapsed else 0.0,
+            "queue": queue.metrics(),
+            "violations": violations,
+        }
+
+    def run_trace_recovery(self):
+        """Run the mixed workload while recording an event trace and read the trace back before the recorder
+        is stopped, as after a crash; every recorded event must be readable once the flush interval has passed.
+        """
+        path = os.path.join(self.root, "unfinished.trace")
+        if not TRACE.start(path):
+            return {"seed": self.seed, "mode": "trace", "violations": ["an event trace is already being recorded"]}
+        try:
+            report = self.run()
+            time.sleep(TRACE_FLUSH_INTERVAL * 2)
+            recorded = TRACE.events
+            _, events = read_trace(path)
+        finally:
+            TRACE.stop()
+        report["mode"] = "trace"
+        report["trace_events"] = {"recorded": recorded, "readable": len(events)}
+        if len(events) != recorded:
+            report["violations"].append(f"only {len(events)} of {recorded} events can be read from a trace that was never stopped")
+        return report
+
+    def run_latency(self, large_writers=4, small_files=100, interval=0.02, max_p95=1.0):
+        """Measure how long small files take to be organized while large files are still being written.
+
+        The large writers keep their files open and growing for the whole run. Small files are measured
+        once with the full pool and once with the pool cut to two workers, as the load monitor does on a
+        busy machine; a p95 above max_p95 seconds in either phase is reported as a violation.
+        """
+        stats, catalog, queue, handler, subscription, observer = self._start()
+        stop_writing = threading.Event()
+
+        def write_large(number):
+            with open(os.path.join(self.base_folder, f"large{number}.zip"), 'wb') as f:
+                chunk = random.Random(f"{self.seed}-large-{number}").randbytes(64 * 1024)
+                while not stop_writing.wait(0.02):
+                    f.write(chunk)
+                    f.flush()
+
+        writers = [threading.Thread(target=write_large, args=(i,), daemon=True) for i in range(large_writers)]
+        phases = {}
+        try:
+            for writer in writers:
+                writer.start()
+            time.sleep(0.5)  # Let the large files get going before timing anything
+            for phase, workers in (("full", self.workers), ("shrunk", 2)):
+                queue.set_workers(workers)
+                created = {}
+                for i in range(small_files):
+                    path = os.path.join(self.base_folder, f"small_{phase}_{i}.txt")
+                    with open(path, 'wb') as f:
+                        f.write(b"x" * 1024)
+                    created[path] = time.time()
+                    time.sleep(interval)
+                deadline = time.monotonic() + 10 * max_p95 + 5
+                latencies = {}
+                while len(latencies) < len(created) and time.monotonic() < deadline:
+                    events, _ = subscription.take(timeout=0.1)
+                    for event in events:
+                        if event["type"] == "organized" and event["path"] in created:
+                            latencies[event["path"]] = event["time"] - created[event["path"]]
+                phases[phase] = (workers, sorted(latencies.values()), len(created) - len(latencies))
+        finally:
+            stop_writing.set()
+            for writer in writers:
+                writer.join()
+            wait_until_queue_idle(queue)
+            self._stop(queue, handler, subscription, observer)
+        report = {"seed": self.seed, "mode": "latency", "large_writers": large_writers, "violations": []}
+        for phase, (workers, latencies, missing) in phases.items():
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else None
+            report[phase] = {
+                "workers": workers,
+                "organized": len(latencies),
+                "missing": missing,
+                "p50_seconds": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "max_seconds": round(latencies[-1], 3) if latencies else None,
+            }
+            if missing:
+                report["violations"].append(f"{missing} small files were not organized with {workers} workers")
+            if p95 is None or p95 > max_p95:
+                report["violations"].append(f"small-file p95 latency {p95} s exceeds {max_p95} s with {workers} workers")
+        return report
+
+    def _run_actor(self, actor, count):
+        rng = random.Random(f"{self.seed}-{actor[0]}-{actor[1]}")
+        for _ in range(count):
+            self._operate(actor, rng)
+
+    def _operate(self, actor, rng):
+        kind, number = actor
+        try:
+            done = {'write': self._write, 'rename': self._rename, 'delete': self._delete}[kind](number, rng)
+        except OSError as e:
+            logging.debug("Stress %s %d failed: %s", kind, number, e)
+            done = False
+        with self.ledger_lock:
+            self.counts[kind if done else 'skipped'] += 1
+
+    def _write(self, number, rng):
+        """Create a file under a colliding name with a unique token header and random payload."""
+        path = os.path.join(self.base_folder, rng.choice(self.NAMES) + rng.choice(self.EXTENSIONS))
+        payload = rng.randbytes(rng.randrange(self.max_size))
+        try:
+            f = open(path, 'xb')
+        except FileExistsError:
+            return False
+        with f:
+            with self.ledger_lock:
+                token = f"w{number}:{len(self.ledger)}".encode().ljust(self.HEADER_SIZE - 1) + b"\n"
+                content = token + payload
+                self.ledger[token] = [len(content), zlib.crc32(content), False]
+            for offset in range(0, len(content), 16384):
+                f.write(content[offset:offset + 16384])
+        return True
+
+    def _rename(self, number, rng):
+        """Rename a loose file to a unique name, often finishing a download by changing its extension."""
+        with os.scandir(self.base_folder) as entries:
+            loose = sorted(entry.name for entry in entries if entry.is_file(follow_symlinks=False))
+        if not loose:
+            return False
+        source = rng.choice(loose)
+        target = f"r{number}_{rng.getrandbits(48):012x}{rng.choice(self.EXTENSIONS[:8])}"
+        with self.mutation_lock:
+            os.rename(os.path.join(self.base_folder, source), os.path.join(self.base_folder, target))
+        return True
+
+    def _delete(self, number, rng):
+        """Delete an organized file, or a loose temporary one, and mark its token deleted."""
+        folders = [self.base_folder] + sorted(entry.path for entry in os.scandir(self.base_folder) if entry.is_dir(follow_symlinks=False))
+        folder = rng.choice(folders)
+        with os.scandir(folder) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_file(follow_symlinks=False)
+                           and (folder != self.base_folder or get_category(entry.name, self.config.categories, self.config.temp_suffixes) is None))
+        if not names:
+            return False
+        path = os.path.join(folder, rng.choice(names))
+        with self.mutation_lock:
+            with open(path, 'rb') as f:
+                token = f.read(self.HEADER_SIZE)
+            if len(token) < self.HEADER_SIZE:
+                return False  # Its writer has not written the token yet, so the deletion could not be recorded
+            os.remove(path)
+        with self.ledger_lock:
+            if token in self.ledger:
+                self.ledger[token][2] = True
+        return True
+
+    def check(self, events, stats, catalog):
+        """Return a list of invariant violations for the final tree."""
+        violations = []
+        found = {}
+        counts = {}
+        actual_paths = set()
+        for dirpath, _, filenames in os.walk(self.base_folder):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                actual_paths.add(path)
+                with open(path, 'rb') as f:
+                    content = f.read()
+                token = content[:self.HEADER_SIZE]
+                found.setdefault(token, []).append(path)
+                entry = self.ledger.get(token)
+                if entry is None:
+                    violations.append(f"unexpected file {path}")
+                elif (len(content), zlib.crc32(content)) != (entry[0], entry[1]):
+                    violations.append(f"corrupted or clobbered file {path}")
+                category = get_category(name, self.config.categories, self.config.temp_suffixes)
+                expected_folder = self.base_folder if category is None else os.path.join(self.base_folder, category)
+                if dirpath != expected_folder:
+                    violations.append(f"{path} is not in {expected_folder}")
+                if category and dirpath == expected_folder:
+                    counts[category] = counts.get(category, 0) + 1
+        for token, (_, _, deleted) in self.ledger.items():
+            paths = found.get(token, [])
+            if deleted and paths:
+                violations.append(f"deleted file {token.strip().decode()} came back at {paths}")
+            elif not deleted and not paths:
+                violations.append(f"lost file {token.strip().decode()}")
+            elif len(paths) > 1:
+                violations.append(f"file {token.strip().decode()} duplicated at {paths}")
+        for event in events:
+            if event["type"] == "organized" and os.path.dirname(event["path"]) != self.base_folder:
+                violations.append(f"{event['path']} was moved again after being organized")
+        indexed = {row["category"]: row["count"] for row in stats.summary() if row["folder"] == self.base_folder and row["count"]}
+        if indexed != counts:
+            violations.append(f"statistics {indexed} do not match files on disk {counts}")
+        cataloged = set(catalog.query())
+        if cataloged != actual_paths:
+            violations.append(f"catalog is off by {len(cataloged - actual_paths)} stale and {len(actual_paths - cataloged)} missing files")
+        return violations
+
+
+def main(argv):
+    """Run the stress harness from command line options and print its report; returns the exit status."""
+    def option(name, default):
+        if name in argv and argv.index(name) + 1 < len(argv):
+            return type(default)(argv[argv.index(name) + 1])
+        return default
+    root = tempfile.mkdtemp(prefix="organizer-stress-")
+    try:
+        harness = StressHarness(
+            root,
+            seed=option("--seed", int(time.time())),
+            workers=option("--workers", HANDLER_WORKERS),
+            writers=option("--writers", 4),
+            renamers=option("--renamers", 2),
+            deleters=option("--deleters", 1),
+            operations=option("--operations", 2000),
+            replay="--replay" in argv
+        )
+        scenario = option("--scenario", "mixed")
+        if scenario == "latency":
+            report = harness.run_latency(large_writers=option("--large-writers", 4), small_files=option("--small-files", 100))
+        elif scenario == "trace":
+            report = harness.run_trace_recovery()
+        else:
+            report = harness.run()
+    finally:
+        if "--keep" not in argv:
+            shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    if report["violations"]:
+        if report["mode"] == "latency":
+            print(f"FAILED: {'; '.join(report['violations'])}")
+        else:
+            print(f"FAILED: {len(report['violations'])} violations (retry with --replay --seed {report['seed']})")
+        return 1
+    if report["mode"] == "latency":
+        print(f"OK: small-file p95 {report['full']['p95_seconds']} s with {report['full']['workers']} workers, "
+              f"{report['shrunk']['p95_seconds']} s with {report['shrunk']['workers']}")
+    else:
+        print(f"OK: {report['organized']} files organized, {report['organized_per_second']} per second")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,61 @@
+import http.client
+import json
+
+import pytest
+
+import organizer
+
+TOKEN = "test-token"
+
+
+class FakeApp:
+    is_watching = False
+
+    def get_status(self):
+        return {"watching": self.is_watching}
+
+
+@pytest.fixture
+def port():
+    server = organizer.ControlServer(FakeApp(), {"port": 0, "token": TOKEN})
+    port = server.start()
+    yield port
+    server.stop()
+
+
+def request(port, path, headers=None, method="GET"):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path, headers={"Authorization": f"Bearer {TOKEN}", **(headers or {})})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_status_with_token(port):
+    assert request(port, "/status") == (200, {"watching": False})
+
+
+def test_missing_token_is_rejected(port):
+    assert request(port, "/status", {"Authorization": ""})[0] == 401
+
+
+@pytest.mark.parametrize("host", ["localhost", "127.0.0.1", "LOCALHOST"])
+def test_local_host_names_are_accepted(port, host):
+    assert request(port, "/status", {"Host": f"{host}:{port}"})[0] == 200
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_foreign_host_is_forbidden(port, method):
+    assert request(port, "/status", {"Host": f"attacker.example:{port}"}, method)[0] == 403
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_origin_header_is_forbidden(port, method):
+    assert request(port, "/stop", {"Origin": "http://attacker.example"}, method)[0] == 403
+
+
+def test_start_requires_token():
+    with pytest.raises(ValueError):
+        organizer.ControlServer(FakeApp(), {"port": 0}).start()
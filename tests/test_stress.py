@@ -0,0 +1,24 @@
+from stress_harness import StressHarness
+
+
+def test_replayed_workload_keeps_invariants(tmp_path):
+    report = StressHarness(str(tmp_path), seed=1, operations=300, replay=True).run()
+    assert report["violations"] == []
+    assert report["organized"] > 0
+
+
+def test_concurrent_workload_keeps_invariants(tmp_path):
+    report = StressHarness(str(tmp_path), seed=2, operations=300).run()
+    assert report["violations"] == []
+    assert report["organized"] > 0
+
+
+def test_small_files_are_not_stuck_behind_large_writes(tmp_path):
+    report = StressHarness(str(tmp_path), seed=3).run_latency(large_writers=2, small_files=20)
+    assert report["violations"] == []
+
+
+def test_unfinished_trace_is_readable(tmp_path):
+    report = StressHarness(str(tmp_path), seed=4, operations=200).run_trace_recovery()
+    assert report["violations"] == []
+    assert report["trace_events"]["recorded"] > 0
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from watchdog.events import FileClosedEvent, FileCreatedEvent, FileMovedEvent
+
+import organizer
+
+
+@pytest.fixture
+def recorder():
+    recorder = organizer.EventTraceRecorder()
+    yield recorder
+    recorder.stop()
+
+
+def record_download(recorder, base, name, content=b"%PDF-1.4\n"):
+    """Record a download written under a temporary name and renamed once complete, then organized."""
+    partial = os.path.join(base, name + ".crdownload")
+    with open(partial, "wb") as f:
+        f.write(content)
+    recorder.record(base, FileCreatedEvent(partial))
+    recorder.record(base, FileClosedEvent(partial))
+    final = os.path.join(base, name)
+    os.rename(partial, final)
+    recorder.record(base, FileMovedEvent(partial, final))
+    organized = os.path.join(base, "Documents", name)
+    os.makedirs(os.path.dirname(organized), exist_ok=True)
+    os.rename(final, organized)
+    recorder.record(base, FileMovedEvent(final, organized))
+
+
+def test_round_trip_stores_portable_paths(tmp_path, recorder):
+    base = str(tmp_path / "watched")
+    os.makedirs(base)
+    trace = str(tmp_path / "trace.bin")
+    assert recorder.start(trace)
+    record_download(recorder, base, "report.pdf")
+    recorder.stop()
+
+    folders, events = organizer.read_trace(trace)
+    assert folders == [base]
+    assert [(event[1], event[5], event[6]) for event in events] == [
+        ("created", "report.pdf.crdownload", None),
+        ("closed", "report.pdf.crdownload", None),
+        ("moved", "report.pdf.crdownload", "report.pdf"),
+        ("moved", "report.pdf", "Documents/report.pdf"),
+    ]
+    assert events[0][4] == len(b"%PDF-1.4\n")
+
+    root = str(tmp_path / "replay")
+    report = organizer.TraceReplayer(trace, root, speed=0).run()
+    assert report["organized"] == 1
+    assert report["skipped"] == 1  # The recorded organizer move is left to the replayed organizer
+    replayed = os.path.join(root, "folder0")
+    assert sorted(os.listdir(replayed)) == ["Documents"]
+    assert os.listdir(os.path.join(replayed, "Documents")) == ["report.pdf"]
+
+
+def test_path_table_restarts_when_full(tmp_path, recorder, monkeypatch):
+    monkeypatch.setattr(organizer, "TRACE_MAX_PATHS", 4)
+    base = str(tmp_path)
+    trace = str(tmp_path / "trace.bin")
+    names = [f"file{i}.txt" for i in range(10)]
+    assert recorder.start(trace)
+    for name in names:
+        recorder.record(base, FileCreatedEvent(os.path.join(base, name)))
+    recorder.record(base, FileMovedEvent(os.path.join(base, names[0]), os.path.join(base, "renamed.txt")))
+    assert len(recorder.path_ids) <= 4
+    recorder.stop()
+
+    _, events = organizer.read_trace(trace)
+    assert [event[5] for event in events] == names + [names[0]]
+    assert events[-1][6] == "renamed.txt"
+
+
+@pytest.mark.parametrize("args", [
+    [],
+    ["--speed", "3"],
+    ["missing.trace"],
+    ["TRACE", "--speed", "fast"],
+    ["TRACE", "--workers", "two"],
+    ["TRACE", "--workers", "0"],
+])
+def test_replay_rejects_bad_arguments(tmp_path, capsys, args):
+    trace = tmp_path / "trace.bin"
+    trace.write_bytes(organizer.TRACE_MAGIC)
+    argv = ["organizer.py", "--replay-trace"] + [str(trace) if arg == "TRACE" else arg for arg in args]
+    assert organizer.run_trace_replay(argv) == 2
+    assert capsys.readouterr().err.startswith("usage: ")
+
+
+def test_replay_rejects_a_file_that_is_not_a_trace(tmp_path, capsys):
+    other = tmp_path / "notes.txt"
+    other.write_text("hello")
+    assert organizer.run_trace_replay(["organizer.py", "--replay-trace", str(other)]) == 2
+    assert "is not an event trace" in capsys.readouterr().err